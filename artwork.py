@@ -0,0 +1,132 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from config import CACHE_DIR
+
+ARTWORK_DIR = CACHE_DIR / "art"
+
+# Pixels per side of the stored art; half blocks show two pixel rows per line,
+# so this is ART_SIZE columns by ART_SIZE / 2 lines in the panel
+ART_SIZE = 16
+
+# Rendered images kept in memory (each is a few hundred bytes)
+MEMORY_ENTRIES = 128
+
+FETCH_TIMEOUT = 5
+
+
+class ArtworkCache:
+    """Album art fetched once over a pooled HTTP session, stored downscaled on disk and rendered as half blocks"""
+
+    def __init__(self, art_dir=ARTWORK_DIR, size=ART_SIZE, workers=2):
+        self.art_dir = art_dir
+        self.size = size
+        self.workers = workers
+        self.lock = threading.Lock()
+        # url -> rendered Text, or None if the image could not be loaded
+        self.rendered = OrderedDict()
+        self.pending = set()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="artwork")
+        self._session = None
+        # Offline mode: only art already on disk is shown
+        self.offline = False
+
+    @property
+    def session(self):
+        """One keep-alive HTTP session for every image host, created on first download"""
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.workers)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            self._session = session
+        return self._session
+
+    def path_for(self, url):
+        return self.art_dir / f"{hashlib.sha1(url.encode()).hexdigest()}.png"
+
+    def get(self, url):
+        """Rendered art for a thumbnail URL, or None while it loads (loading starts in the background)"""
+        if not url:
+            return None
+        with self.lock:
+            if url in self.rendered:
+                self.rendered.move_to_end(url)
+                return self.rendered[url]
+        self.request(url)
+        return None
+
+    def request(self, url):
+        """Start loading art in the background unless it is loaded or loading already"""
+        if not url:
+            return
+        with self.lock:
+            if url in self.rendered or url in self.pending:
+                return
+            if self.offline and not self.path_for(url).exists():
+                return
+            self.pending.add(url)
+        self.executor.submit(self._load, url)
+
+    def _load(self, url):
+        rendered = None
+        try:
+            rendered = render_half_blocks(self._image(url))
+        except ImportError:
+            pass  # Pillow isn't installed, so there is no art to show
+        except Exception as e:
+            print(f"Artwork error: {e}")
+        with self.lock:
+            self.pending.discard(url)
+            self.rendered[url] = rendered
+            while len(self.rendered) > MEMORY_ENTRIES:
+                self.rendered.popitem(last=False)
+
+    def _image(self, url):
+        """The downscaled image from disk, downloading and shrinking it the first time"""
+        from PIL import Image
+        from io import BytesIO
+
+        path = self.path_for(url)
+        if path.exists():
+            with Image.open(path) as image:
+                return image.convert('RGB')
+
+        response = self.session.get(url, timeout=FETCH_TIMEOUT)
+        response.raise_for_status()
+        with Image.open(BytesIO(response.content)) as image:
+            # draft() lets JPEG decoding skip straight to a smaller scale
+            image.draft('RGB', (self.size * 4, self.size * 4))
+            small = image.convert('RGB').resize((self.size, self.size), Image.LANCZOS)
+        self.art_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        small.save(tmp_path, format='PNG')
+        tmp_path.replace(path)
+        return small
+
+    def shutdown(self):
+        """Stop the download threads and close the session"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self._session is not None:
+            self._session.close()
+
+
+def render_half_blocks(image):
+    """Render an RGB image as text, two pixel rows per line ('▀' in the top colour on the bottom one)"""
+    from rich.style import Style
+    from rich.text import Text
+
+    width, height = image.size
+    pixels = image.load()
+    text = Text()
+    for y in range(0, height - 1, 2):
+        if y:
+            text.append("\n")
+        for x in range(width):
+            top, bottom = pixels[x, y], pixels[x, y + 1]
+            text.append("▀", Style(color=f"rgb({top[0]},{top[1]},{top[2]})",
+                                   bgcolor=f"rgb({bottom[0]},{bottom[1]},{bottom[2]})"))
+    return text
@@ -0,0 +1,344 @@
+"""Local stand-ins for the network services and the sound card
+
+install() puts fake ytmusicapi, yt_dlp and spotipy modules into sys.modules
+and swaps pygame.mixer for a null sink, so the player code runs unchanged
+with a configurable latency and payload size and without any I/O beyond
+the local disk.
+"""
+import os
+import sys
+import time
+import types
+import threading
+
+import pygame
+
+
+class Latency:
+    """Simulated network conditions shared by every fake service"""
+
+    def __init__(self, ms=50, payload_kb=4096, track_ms=500):
+        self.ms = ms
+        self.payload_kb = payload_kb
+        self.track_ms = track_ms
+        self.calls = 0
+        self.downloads = 0
+
+    def wait(self):
+        self.calls += 1
+        if self.ms:
+            time.sleep(self.ms / 1000)
+
+
+def _video_id(n):
+    return f"vid{n:08d}"
+
+
+class FakeYTMusic:
+    """ytmusicapi.YTMusic returning deterministic song results"""
+
+    latency = Latency()
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def search(self, query, filter=None, limit=20):
+        self.latency.wait()
+        seed = abs(hash(query))
+        return [{
+            'videoId': _video_id((seed + i) % 10 ** 8),
+            'title': f"{query} {i}",
+            'artists': [{'name': f"Artist {(seed + i) % 97}"}],
+            'album': {'name': f"Album {(seed + i) % 31}"},
+            'duration': '3:30',
+            'duration_seconds': 210,
+            'thumbnails': [{'url': f"https://lh3.googleusercontent.com/{seed:x}{i}=w120-h120"}],
+        } for i in range(limit)]
+
+
+class DownloadError(Exception):
+    pass
+
+
+class DownloadCancelled(Exception):
+    pass
+
+
+class FakeYoutubeDL:
+    """yt_dlp.YoutubeDL that 'downloads' a payload of random bytes into outtmpl"""
+
+    latency = Latency()
+
+    def __init__(self, params=None):
+        self.params = params or {}
+
+    def _info(self, url):
+        video_id = url.rsplit('=', 1)[-1]
+        expire = int(time.time()) + 6 * 3600
+        return {
+            'id': video_id,
+            'duration': self.latency.track_ms / 1000,
+            'url': f"https://rr1---sn.googlevideo.com/videoplayback?expire={expire}&id={video_id}",
+        }
+
+    def _hook(self, kind, **status):
+        for hook in self.params.get(kind, []):
+            hook(status)
+
+    def _download(self, info):
+        """Write the payload in chunks over latency.ms, reporting progress like yt-dlp"""
+        postprocessors = self.params.get('postprocessors') or [{}]
+        ext = postprocessors[0].get('preferredcodec', 'webm')
+        path = self.params['outtmpl'].replace('%(id)s', info['id']).replace('%(ext)s', ext)
+        chunks = max(1, self.latency.payload_kb // 256)
+        started = time.perf_counter()
+        with open(path, 'wb') as f:
+            for _ in range(chunks):
+                self._hook('progress_hooks', status='downloading', info_dict=info)
+                f.write(os.urandom(self.latency.payload_kb * 1024 // chunks))
+                if self.latency.ms:
+                    time.sleep(self.latency.ms / 1000 / chunks)
+        self.latency.downloads += 1
+        self._hook('progress_hooks', status='finished', info_dict=info, elapsed=time.perf_counter() - started)
+        self._hook('postprocessor_hooks', status='started', postprocessor='ExtractAudio', info_dict=info)
+        self._hook('postprocessor_hooks', status='finished', postprocessor='ExtractAudio', info_dict=info)
+
+    def extract_info(self, url, download=True):
+        self.latency.wait()
+        info = self._info(url)
+        if download:
+            self._download(info)
+        return info
+
+    def sanitize_info(self, info):
+        return info
+
+    def process_ie_result(self, info, download=True):
+        if download:
+            self._download(info)
+        return info
+
+    def close(self):
+        pass
+
+
+class FakeSpotify:
+    """spotipy.Spotify serving one user playlist of a configurable size"""
+
+    latency = Latency()
+    playlist_size = 1000
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def _track(self, n):
+        return {
+            'id': f"sp{n:08d}",
+            'name': f"Track {n}",
+            'duration_ms': 180000 + n % 60000,
+            'external_ids': {'isrc': f"USXX{n:08d}"},
+            'artists': [{'name': f"Artist {n % 97}"}],
+            'album': {'name': f"Album {n % 31}", 'images': [{'url': f"https://i.scdn.co/image/{n:040x}"}]},
+        }
+
+    def search(self, q, limit=10, type='track'):
+        self.latency.wait()
+        return {'tracks': {'items': [self._track(abs(hash(q)) % 10 ** 6 + i) for i in range(limit)]}}
+
+    def current_user_playlists(self, limit=50, offset=0):
+        self.latency.wait()
+        return {'total': 1, 'items': [{'id': 'bench', 'name': 'Benchmark', 'tracks': {'total': self.playlist_size}}]}
+
+    def playlist_items(self, playlist_id, fields=None, limit=100, offset=0, additional_types=None):
+        self.latency.wait()
+        end = min(offset + limit, self.playlist_size)
+        return {'total': self.playlist_size, 'items': [{'track': self._track(n)} for n in range(offset, end)]}
+
+
+class FakeSpotifyOAuth:
+    def __init__(self, *args, **kwargs):
+        pass
+
+
+class NullMusic:
+    """pygame.mixer.music that plays silence for track_ms and posts the end event"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.endevent = None
+        self.loaded = None
+        self.queued = None
+        self.started_at = None
+        self.paused_at = None
+        self.offset_ms = 0
+        self.timer = None
+        self.timeline = []
+
+    def _schedule(self, remaining_ms):
+        if self.timer:
+            self.timer.cancel()
+        self.timer = threading.Timer(max(0, remaining_ms) / 1000, self._finish)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def _finish(self):
+        with self.lock:
+            self.timeline.append(('end', self.loaded, time.perf_counter()))
+            if self.queued:
+                # Gapless: the mixer switches to the queued file by itself
+                self.loaded, self.queued = self.queued, None
+                self.started_at = time.perf_counter()
+                self.timeline.append(('start', self.loaded, self.started_at))
+                self._schedule(self.latency.track_ms)
+            else:
+                self.started_at = None
+        if self.endevent:
+            pygame.event.post(pygame.event.Event(self.endevent))
+
+    def load(self, path):
+        self.loaded = path
+
+    def unload(self):
+        self.loaded = None
+
+    def play(self, loops=0, start=0.0, fade_ms=0):
+        with self.lock:
+            self.started_at = time.perf_counter()
+            self.paused_at = None
+            self.offset_ms = 0
+            self.timeline.append(('start', self.loaded, self.started_at))
+            self._schedule(self.latency.track_ms)
+
+    def stop(self):
+        with self.lock:
+            was_playing = self.started_at is not None
+            if self.timer:
+                self.timer.cancel()
+            self.started_at = None
+            self.queued = None
+        if was_playing and self.endevent:
+            pygame.event.post(pygame.event.Event(self.endevent))
+
+    def fadeout(self, ms):
+        self.stop()
+
+    def pause(self):
+        with self.lock:
+            if self.started_at is not None and self.paused_at is None:
+                self.paused_at = time.perf_counter()
+                if self.timer:
+                    self.timer.cancel()
+
+    def unpause(self):
+        with self.lock:
+            if self.paused_at is not None:
+                self.started_at += time.perf_counter() - self.paused_at
+                self.paused_at = None
+                self._schedule(self.latency.track_ms - self.get_pos())
+
+    def get_busy(self):
+        return self.started_at is not None and self.paused_at is None
+
+    def get_pos(self):
+        if self.started_at is None:
+            return -1
+        now = self.paused_at or time.perf_counter()
+        return int((now - self.started_at) * 1000)
+
+    def set_pos(self, seconds):
+        pass
+
+    def queue(self, path):
+        self.queued = path
+
+    def set_endevent(self, event_type=0):
+        self.endevent = event_type
+
+    def set_volume(self, volume):
+        pass
+
+
+class NullChannel:
+    def __init__(self):
+        self.current = None
+        self.next = None
+
+    def play(self, sound):
+        self.current = sound
+
+    def queue(self, sound):
+        self.next = sound
+
+    def get_queue(self):
+        return None
+
+    def get_busy(self):
+        return False
+
+    def pause(self):
+        pass
+
+    def unpause(self):
+        pass
+
+    def stop(self):
+        self.current = None
+
+    def set_volume(self, volume):
+        pass
+
+
+class NullMixer:
+    """pygame.mixer with nothing behind it"""
+
+    def __init__(self, latency):
+        self.music = NullMusic(latency)
+        self.initialized = None
+
+    def init(self, frequency=44100, size=-16, channels=2, buffer=4096):
+        self.initialized = (frequency, size, channels)
+
+    def get_init(self):
+        return self.initialized
+
+    def quit(self):
+        self.initialized = None
+
+    def find_channel(self, force=False):
+        return NullChannel()
+
+    def Sound(self, buffer=None):
+        return buffer
+
+
+def install(latency):
+    """Route every external service used by the player to the stand-ins"""
+    for fake in (FakeYTMusic, FakeYoutubeDL, FakeSpotify):
+        fake.latency = latency
+
+    ytmusicapi = types.ModuleType('ytmusicapi')
+    ytmusicapi.YTMusic = FakeYTMusic
+
+    yt_dlp = types.ModuleType('yt_dlp')
+    yt_dlp.YoutubeDL = FakeYoutubeDL
+    yt_dlp.utils = types.ModuleType('yt_dlp.utils')
+    yt_dlp.utils.DownloadError = DownloadError
+    yt_dlp.utils.DownloadCancelled = DownloadCancelled
+
+    spotipy = types.ModuleType('spotipy')
+    spotipy.Spotify = FakeSpotify
+    spotipy.oauth2 = types.ModuleType('spotipy.oauth2')
+    spotipy.oauth2.SpotifyOAuth = FakeSpotifyOAuth
+
+    sys.modules.update({
+        'ytmusicapi': ytmusicapi,
+        'yt_dlp': yt_dlp,
+        'yt_dlp.utils': yt_dlp.utils,
+        'spotipy': spotipy,
+        'spotipy.oauth2': spotipy.oauth2,
+    })
+
+    mixer = NullMixer(latency)
+    pygame.mixer = mixer
+    return mixer
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""Offline benchmark suite: search, time-to-first-audio, track changes, playlists and memory
+
+Usage: python benchmarks/suite.py [--latency-ms 30] [--payload-kb 4096] [--track-ms 500]
+                                  [--sizes 100,1000,10000,100000] [--runs 5]
+                                  [--output results.json] [--compare previous.json]
+
+YouTube Music, yt-dlp, Spotify and the sound card are replaced by the local
+stand-ins in stubs.py, and all state lives in a temporary home directory, so
+runs are repeatable and never touch the network or ~/.music_player.
+Results are written as JSON; --compare prints the change against an earlier run.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "1"
+
+import stubs
+
+
+def summarize(samples_ms):
+    """Distribution of a list of millisecond samples"""
+    ordered = sorted(samples_ms)
+    return {
+        'median_ms': round(statistics.median(ordered), 3),
+        'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        'min_ms': round(ordered[0], 3),
+        'max_ms': round(ordered[-1], 3),
+        'n': len(ordered),
+    }
+
+
+def timed(fn, *args, **kwargs):
+    """Run fn and return (result, elapsed ms)"""
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def gaps_ms(timeline):
+    """Silence between each natural track end and the next start on the null mixer"""
+    gaps = []
+    for i, (kind, _, at) in enumerate(timeline):
+        if kind != 'end':
+            continue
+        start = next((t for k, _, t in timeline[i + 1:] if k == 'start'), None)
+        if start is not None:
+            gaps.append((start - at) * 1000)
+    return gaps
+
+
+def bench_search(app, runs):
+    """Remote fan-out (cold and cached) and local library search"""
+    queries = [f"benchmark query {i}" for i in range(runs)]
+    cold = [timed(app.search_music, q)[1] for q in queries]
+    warm = [timed(app.search_music, q)[1] for q in queries]
+    youtube = [timed(app.youtube.search, q, 30, False)[1] for q in queries]
+    local = [timed(app.library.search, q, 20)[1] for q in queries]
+    return {
+        'search.fanout_cold': summarize(cold),
+        'search.fanout_cached': summarize(warm),
+        'search.youtube_uncached': summarize(youtube),
+        'search.local': summarize(local),
+    }
+
+
+def bench_ttfa(app, mixer, runs):
+    """Time from play() to the mixer starting, on a cache miss and on a hit"""
+    from track import Track
+
+    results = {}
+    for label in ('cold', 'cached'):
+        samples = []
+        for i in range(runs):
+            video_id = f"ttfa{i:04d}"
+            started = time.perf_counter()
+            app.player.play(video_id, Track(video_id, f"TTFA {i}", "Bench", "Bench", 0))
+            samples.append((mixer.music.timeline[-1][2] - started) * 1000)
+        results[f'ttfa.{label}'] = summarize(samples)
+    app.player.stop()
+    return results
+
+
+def bench_track_change(app, mixer, latency, runs):
+    """Gap between tracks, with the next track queued in the mixer and without"""
+    from track import Track
+
+    tracks = [Track(f"change{i:04d}", f"Change {i}", "Bench", "Bench", latency.track_ms)
+              for i in range(runs + 1)]
+    for track in tracks:
+        app.player.fetch(track.id)
+
+    def play_through():
+        mixer.music.timeline.clear()
+        app.player.load_playlist(list(tracks))
+        app.play_track_from_info(app.player.play_next())
+        while app.player.current_index < len(tracks) - 1:
+            time.sleep(latency.track_ms / 4000)
+        # Let the last track run out so its end lands in the timeline
+        time.sleep(latency.track_ms / 1000 * 1.5)
+        app.player.stop()
+        return gaps_ms(mixer.music.timeline)
+
+    # The app lines the next cached track up in the mixer
+    queued = play_through()
+
+    # Nothing lined up: the auto-play thread starts each track after the end event
+    app.player.queue_next = lambda track_info, index: False
+    try:
+        unqueued = play_through()
+    finally:
+        del app.player.queue_next
+
+    return {
+        'track_change.queued_gap': summarize(queued or [0.0]),
+        'track_change.unqueued_gap': summarize(unqueued or [0.0]),
+    }
+
+
+def bench_skip_burst(app, latency, runs, presses=5):
+    """Pressing 'next' several times in a row: time until the last track plays, and downloads finished"""
+    from track import Track
+
+    waits, downloads = [], []
+    for run in range(runs):
+        tracks = [Track(f"skip{run:03d}{i:02d}", f"Skip {i}", "Bench", "Bench", latency.track_ms)
+                  for i in range(presses + 1)]
+        app.player.load_playlist(tracks)
+        # Skipping starts from a track that is playing (and long enough to still be
+        # playing when the burst lands), so its stop is part of what is measured
+        track_ms, latency.track_ms = latency.track_ms, 60 * 60 * 1000
+        app.handle_command("next")
+        deadline = time.perf_counter() + 30
+        while app.player.current_track != tracks[0] and time.perf_counter() < deadline:
+            time.sleep(0.005)
+        latency.track_ms = track_ms
+        # Prefetches the warm-up track started are not the burst's downloads
+        while app.prefetcher.pending and time.perf_counter() < deadline:
+            time.sleep(0.005)
+        before = latency.downloads
+        started = time.perf_counter()
+        for _ in range(presses):
+            app.handle_command("next")
+        deadline = started + 30
+        while app.player.current_track != tracks[-1] and time.perf_counter() < deadline:
+            time.sleep(0.005)
+        waits.append((time.perf_counter() - started) * 1000)
+        downloads.append(latency.downloads - before)
+        # The end events of the tracks skipped past must not stop the one that won
+        time.sleep(min(0.05, latency.track_ms / 4000))
+        state = app.player.state
+        if state.track != tracks[-1] or not state.playing:
+            raise RuntimeError(f"skip burst left {state.track and state.track.title} "
+                               f"{'playing' if state.playing else 'stopped'}")
+        app.player.stop()
+        app.prefetcher.reset()
+    return {
+        'skip_burst.last_track_ms': summarize(waits),
+        'skip_burst.downloads': round(statistics.mean(downloads), 2),
+    }
+
+
+def bench_playlists(app, sizes, runs):
+    """Saving and loading local playlists, and loading Spotify playlists, by size"""
+    from config import PLAYLISTS_FILE
+    from store import PlaylistStore
+    from track import Track
+
+    results = {}
+    for size in sizes:
+        tracks = [Track(f"pl{n:08d}", f"Track {n}", f"Artist {n % 97}", f"Album {n % 31}", 200000)
+                  for n in range(size)]
+
+        # A legacy playlists.json of this size, imported in one transaction
+        db_path = Path(tempfile.mkdtemp()) / "playlists.db"
+        with open(PLAYLISTS_FILE, 'w') as f:
+            json.dump({'bench': [t.to_dict() for t in tracks]}, f)
+        store, migrate_ms = timed(PlaylistStore, path=db_path)
+
+        appends = [timed(store.append, 'bench', tracks[i % size])[1] for i in range(runs)]
+        loads = [timed(store.tracks, 'bench')[1] for _ in range(runs)]
+        store.close()
+        shutil.rmtree(db_path.parent)
+
+        stubs.FakeSpotify.playlist_size = size
+        spotify = [timed(app.spotify.get_playlist_tracks, 'bench')[1] for _ in range(max(1, runs // 2))]
+
+        results[f'playlist.{size}.migrate_ms'] = round(migrate_ms, 3)
+        results[f'playlist.{size}.append'] = summarize(appends)
+        results[f'playlist.{size}.load'] = summarize(loads)
+        results[f'playlist.{size}.spotify_load'] = summarize(spotify)
+    return results
+
+
+def bench_memory(app, latency, sizes):
+    """Peak memory of loading a Spotify playlist into the play queue"""
+    results = {}
+    saved_ms, latency.ms = latency.ms, 0
+    try:
+        for size in sizes:
+            stubs.FakeSpotify.playlist_size = size
+            tracemalloc.start()
+            tracks = app.spotify.get_playlist_tracks('bench')
+            app.player.load_playlist(tracks)
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            app.player.load_playlist([])
+            del tracks
+            results[f'memory.queue_{size}.peak_kb'] = round(peak / 1024, 1)
+            results[f'memory.queue_{size}.bytes_per_track'] = round(current / size, 1)
+    finally:
+        latency.ms = saved_ms
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(previous, current):
+    """Print each metric next to its value in an earlier run"""
+    def scalar(value):
+        return value['median_ms'] if isinstance(value, dict) else value
+
+    print(f"\n{'metric':<44} {'before':>12} {'after':>12} {'change':>9}")
+    for name, value in current['metrics'].items():
+        if name not in previous.get('metrics', {}):
+            continue
+        before, after = scalar(previous['metrics'][name]), scalar(value)
+        change = f"{(after - before) / before * 100:+8.1f}%" if before else "       -"
+        print(f"{name:<44} {before:>12.3f} {after:>12.3f} {change:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency-ms', type=float, default=30, help="simulated latency per network call")
+    parser.add_argument('--payload-kb', type=int, default=4096, help="size of each downloaded track")
+    parser.add_argument('--track-ms', type=int, default=500, help="length of each track on the null mixer")
+    parser.add_argument('--sizes', default="100,1000,10000,100000", help="queue/playlist sizes")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--output', default=f"benchmark-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    parser.add_argument('--compare', help="earlier results file to compare against")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    latency = stubs.Latency(args.latency_ms, args.payload_kb, args.track_ms)
+    mixer = stubs.install(latency)
+
+    # Everything the app stores goes to a throwaway home directory
+    home = tempfile.mkdtemp(prefix="kaiyafi-bench-")
+    saved_home = os.environ.get('HOME')
+    os.environ['HOME'] = home
+    try:
+        from config import load_config, save_config, CACHE_DIR
+        import ui
+        config = load_config()
+        config['spotify'].update(client_id='bench', client_secret='bench')
+        save_config(config)
+        (CACHE_DIR / ".spotify_cache").touch()
+        ui.console.quiet = True
+
+        from main import MusicPlayerApp
+        app = MusicPlayerApp()
+        metrics = {'startup.init_ms': round(sum(ms for _, ms in app.startup_phases), 3)}
+
+        for name, bench in [
+            ("search", lambda: bench_search(app, args.runs)),
+            ("time-to-first-audio", lambda: bench_ttfa(app, mixer, args.runs)),
+            ("track change", lambda: bench_track_change(app, mixer, latency, args.runs)),
+            ("skip burst", lambda: bench_skip_burst(app, latency, args.runs)),
+            ("playlists", lambda: bench_playlists(app, sizes, args.runs)),
+            ("memory", lambda: bench_memory(app, latency, sizes)),
+        ]:
+            print(f"running {name}...", file=sys.stderr)
+            metrics.update(bench())
+
+        if app._jobs:
+            app._jobs.shutdown()
+        app.prefetcher.shutdown()
+        app.resolver.shutdown()
+        app.player.close()
+    finally:
+        if saved_home is None:
+            os.environ.pop('HOME', None)
+        else:
+            os.environ['HOME'] = saved_home
+        shutil.rmtree(home, ignore_errors=True)
+
+    results = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'params': vars(args),
+        'metrics': metrics,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    for name, value in metrics.items():
+        shown = f"median {value['median_ms']:.3f} ms  p95 {value['p95_ms']:.3f} ms" if isinstance(value, dict) else value
+        print(f"{name:<44} {shown}")
+    print(f"\nwrote {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
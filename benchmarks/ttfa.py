@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Time-to-first-audio: native opus remux vs. the legacy mp3 transcode path
+
+Usage: python benchmarks/ttfa.py <videoId> [<videoId> ...] [--runs N]
+
+Every run uses an empty temporary audio cache, so each measurement covers the
+full yt-dlp download, the ffmpeg postprocessing step and mixer.load/play.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import pygame
+from cache import AudioCache
+from player import MusicPlayer
+
+CODECS = ['mp3', 'opus']
+
+
+def time_to_first_audio(player, video_id, codec):
+    """Download a track into an emptied cache and start playing it"""
+    player.cache.clear()
+    start = time.perf_counter()
+    path = player.fetch(video_id, codec=codec)
+    pygame.mixer.music.load(path)
+    pygame.mixer.music.play()
+    elapsed = time.perf_counter() - start
+    size = os.path.getsize(path)
+    pygame.mixer.music.stop()
+    pygame.mixer.music.unload()
+    return elapsed, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('video_ids', nargs='+')
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    results = {codec: [] for codec in CODECS}
+    # One player (and its threads) for every run; each run starts from an emptied cache
+    with tempfile.TemporaryDirectory() as cache_dir:
+        player = MusicPlayer(cache=AudioCache(root=cache_dir))
+        try:
+            for video_id in args.video_ids:
+                for run in range(args.runs):
+                    for codec in CODECS:
+                        elapsed, size = time_to_first_audio(player, video_id, codec)
+                        results[codec].append(elapsed)
+                        print(f"{video_id} run {run + 1} {codec:>4}: {elapsed * 1000:8.0f} ms  {size / 1024:8.0f} KiB")
+        finally:
+            player.close()
+
+    print()
+    medians = {codec: statistics.median(times) for codec, times in results.items()}
+    for codec in CODECS:
+        print(f"{codec:>4} median time-to-first-audio: {medians[codec] * 1000:8.0f} ms")
+    print(f"speedup: {medians['mp3'] / medians['opus']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
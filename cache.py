@@ -0,0 +1,461 @@
+import os
+import re
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from config import CACHE_DIR
+
+AUDIO_CACHE_DIR = CACHE_DIR / "audio"
+DEFAULT_CACHE_SIZE_MB = 1024
+CACHE_POLICIES = ("lru", "lfu")
+
+# Seconds hit counts and access times may wait before the index is written
+INDEX_SAVE_DELAY = 5
+
+SEARCH_CACHE_DB = CACHE_DIR / "search_cache.db"
+# The JSON file the cache used to live in, imported once on startup
+SEARCH_CACHE_FILE = CACHE_DIR / "search_cache.json"
+SEARCH_SCHEMA = """
+CREATE TABLE IF NOT EXISTS searches (
+    key TEXT PRIMARY KEY,
+    time REAL NOT NULL,
+    results TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS searches_time ON searches (time);
+"""
+DEFAULT_SEARCH_TTL = 24 * 60 * 60
+DEFAULT_SEARCH_ENTRIES = 500
+
+# googlevideo URLs are signed with their expiry, as ?expire=... or /expire/.../
+EXPIRE_PATTERN = re.compile(r'[?&/]expire[=/](\d+)')
+STREAM_EXPIRY_MARGIN = 60
+DEFAULT_STREAM_TTL = 60 * 60
+DEFAULT_STREAM_ENTRIES = 200
+
+
+class NotCached(Exception):
+    """Raised for a track that would have to be downloaded while in offline mode"""
+
+
+def ogg_duration_ms(path):
+    """Exact length of an Ogg Opus/Vorbis file from its headers and last granule position"""
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(4096)
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - 65536))
+            tail = f.read()
+    except OSError:
+        return None
+    if not head.startswith(b'OggS'):
+        return None
+
+    opus = head.find(b'OpusHead')
+    vorbis = head.find(b'\x01vorbis')
+    if opus >= 0:
+        rate, pre_skip = 48000, int.from_bytes(head[opus + 10:opus + 12], 'little')
+    elif vorbis >= 0:
+        rate, pre_skip = int.from_bytes(head[vorbis + 12:vorbis + 16], 'little'), 0
+    else:
+        return None
+
+    # The last page's granule position is the total number of samples
+    last_page = tail.rfind(b'OggS')
+    if last_page < 0 or not rate:
+        return None
+    granule = int.from_bytes(tail[last_page + 6:last_page + 14], 'little', signed=True)
+    return max(0, (granule - pre_skip) * 1000 // rate) if granule > 0 else None
+
+
+def _file_checksum(path):
+    """Compute a blake2b checksum of a file"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class AudioCache:
+    """Size-bounded on-disk audio cache keyed by videoId and format"""
+
+    def __init__(self, root=AUDIO_CACHE_DIR, max_size_mb=DEFAULT_CACHE_SIZE_MB, policy="lru"):
+        self.root = Path(root)
+        self.index_file = self.root / "index.json"
+        self.tmp_dir = self.root / "tmp"
+        self.max_bytes = int(max_size_mb) * 1024 * 1024
+        self.policy = policy if policy in CACHE_POLICIES else "lru"
+        self.lock = threading.RLock()
+        self.pinned = set()
+        # Keys of files being gathered for offline use, which eviction must not undo
+        self.protected = set()
+        # Keys whose file was checksummed this session; later hits only compare the size
+        self.verified = set()
+        # Access stats not yet written to the index, and the timer that will write them
+        self.dirty = False
+        self.save_timer = None
+        self.hits = 0
+        self.misses = 0
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.tmp_dir.mkdir(exist_ok=True)
+        self.entries = self._load_index()
+
+    @staticmethod
+    def make_key(video_id, fmt):
+        """Build the content address for a videoId/format pair"""
+        return hashlib.sha1(f"{video_id}:{fmt}".encode('utf-8')).hexdigest()
+
+    def _load_index(self):
+        """Load the metadata index, dropping entries whose file is gone"""
+        if not self.index_file.exists():
+            return {}
+        try:
+            with open(self.index_file, 'r') as f:
+                entries = json.load(f)
+        except Exception as e:
+            print(f"Audio cache index error: {e}")
+            return {}
+        return {key: entry for key, entry in entries.items()
+                if (self.root / entry['file']).exists()}
+
+    def _save_index(self):
+        """Atomically write the metadata index"""
+        tmp_file = self.index_file.with_suffix('.tmp')
+        with open(tmp_file, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_file, self.index_file)
+        self.dirty = False
+
+    def _save_later(self):
+        """Write the index within INDEX_SAVE_DELAY seconds, batching the stat updates of many hits"""
+        self.dirty = True
+        if self.save_timer is None:
+            self.save_timer = threading.Timer(INDEX_SAVE_DELAY, self.flush)
+            self.save_timer.daemon = True
+            self.save_timer.start()
+
+    def flush(self):
+        """Write pending access stats to the index now"""
+        with self.lock:
+            if self.save_timer is not None:
+                self.save_timer.cancel()
+                self.save_timer = None
+            if self.dirty:
+                try:
+                    self._save_index()
+                except OSError as e:
+                    print(f"Audio cache index error: {e}")
+
+    def path_for(self, entry):
+        """Absolute path of a cached entry"""
+        return self.root / entry['file']
+
+    def get(self, video_id, fmt):
+        """Return the cached file path for a track, or None on a miss"""
+        key = self.make_key(video_id, fmt)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and not self._check(key, entry):
+                self._remove(key)
+                self._save_index()
+                entry = None
+            if not entry:
+                self.misses += 1
+                return None
+            entry['last_access'] = time.time()
+            entry['hits'] = entry.get('hits', 0) + 1
+            self.hits += 1
+            # Only stats changed, which can wait; losing them in a crash costs nothing
+            self._save_later()
+            return str(self.path_for(entry))
+
+    def contains(self, video_id, fmt):
+        """Check whether a track is cached without touching its stats"""
+        with self.lock:
+            return self.make_key(video_id, fmt) in self.entries
+
+    def entry_size(self, video_id, fmt):
+        """Bytes used by a cached track, or None if it isn't cached"""
+        with self.lock:
+            entry = self.entries.get(self.make_key(video_id, fmt))
+            return entry['size'] if entry else None
+
+    def put(self, video_id, fmt, source_path, duration_ms=None):
+        """Move a downloaded file into the cache and return its new path"""
+        key = self.make_key(video_id, fmt)
+        ext = os.path.splitext(str(source_path))[1] or f".{fmt}"
+        rel_path = os.path.join(key[:2], key + ext)
+        dest = self.root / rel_path
+        dest.parent.mkdir(exist_ok=True)
+
+        with self.lock:
+            shutil.move(str(source_path), str(dest))
+            now = time.time()
+            self.entries[key] = {
+                'video_id': video_id,
+                'format': fmt,
+                'file': rel_path,
+                'size': dest.stat().st_size,
+                'checksum': _file_checksum(dest),
+                # The container's own length is exact; the extractor's is a fallback
+                'duration_ms': ogg_duration_ms(dest) or duration_ms,
+                'created': now,
+                'last_access': now,
+                'hits': 0,
+            }
+            self.verified.add(key)
+            self._evict(keep=key)
+            self._save_index()
+        return str(dest)
+
+    def duration_ms(self, path):
+        """Length recorded for a cached file, or None if unknown"""
+        key = os.path.splitext(os.path.basename(str(path)))[0]
+        with self.lock:
+            entry = self.entries.get(key)
+            return entry.get('duration_ms') if entry else None
+
+    def _check(self, key, entry):
+        """Verify a cached file still matches its recorded size, and its checksum once per session"""
+        path = self.path_for(entry)
+        try:
+            if path.stat().st_size != entry['size']:
+                return False
+            if key in self.verified:
+                return True
+            if _file_checksum(path) != entry['checksum']:
+                return False
+        except OSError:
+            return False
+        self.verified.add(key)
+        return True
+
+    def _remove(self, key):
+        """Drop an entry and its file"""
+        entry = self.entries.pop(key, None)
+        self.verified.discard(key)
+        if entry:
+            try:
+                os.remove(self.path_for(entry))
+            except OSError:
+                pass
+
+    def _eviction_order(self):
+        """Keys ordered from first to last eviction candidate"""
+        if self.policy == "lfu":
+            rank = lambda key: (self.entries[key].get('hits', 0), self.entries[key]['last_access'])
+        else:
+            rank = lambda key: self.entries[key]['last_access']
+        return sorted(self.entries, key=rank)
+
+    def _evict(self, keep=None):
+        """Evict entries until the cache fits in its disk budget"""
+        total = self.total_size()
+        for key in self._eviction_order():
+            if total <= self.max_bytes:
+                break
+            if key == keep or key in self.protected or str(self.path_for(self.entries[key])) in self.pinned:
+                continue
+            total -= self.entries[key]['size']
+            self._remove(key)
+
+    def set_limits(self, max_size_mb=None, policy=None):
+        """Update the disk budget or eviction policy"""
+        with self.lock:
+            if max_size_mb is not None:
+                self.max_bytes = int(max_size_mb) * 1024 * 1024
+            if policy in CACHE_POLICIES:
+                self.policy = policy
+            self._evict()
+            self._save_index()
+
+    def pin(self, path):
+        """Protect a file (e.g. the one currently playing) from eviction"""
+        with self.lock:
+            self.pinned = {str(path)} if path else set()
+
+    def protect(self, video_id, fmt):
+        """Keep a track from being evicted until release() (e.g. while a playlist is downloaded)"""
+        with self.lock:
+            self.protected.add(self.make_key(video_id, fmt))
+
+    def release(self, video_ids, fmt):
+        """Let protected tracks be evicted again"""
+        with self.lock:
+            self.protected.difference_update(self.make_key(video_id, fmt) for video_id in video_ids)
+
+    def total_size(self):
+        """Total bytes used by cached files"""
+        return sum(entry['size'] for entry in self.entries.values())
+
+    def clear(self):
+        """Remove every cached file"""
+        with self.lock:
+            for key in list(self.entries):
+                if str(self.path_for(self.entries[key])) not in self.pinned:
+                    self._remove(key)
+            self._save_index()
+
+    def stats(self):
+        """Summary of cache usage"""
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'size_mb': self.total_size() / (1024 * 1024),
+                'max_size_mb': self.max_bytes / (1024 * 1024),
+                'policy': self.policy,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+class SearchCache:
+    """Persistent TTL cache of search results keyed by (source, query, limit), one SQLite row per search"""
+
+    def __init__(self, path=SEARCH_CACHE_DB, ttl=DEFAULT_SEARCH_TTL, max_entries=DEFAULT_SEARCH_ENTRIES,
+                 legacy_file=SEARCH_CACHE_FILE):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = True
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        # A store writes one row instead of rewriting every cached search
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SEARCH_SCHEMA)
+        self._migrate(legacy_file)
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM searches WHERE time <= ?", (time.time() - self.ttl,))
+
+    @staticmethod
+    def normalize(query):
+        """Normalize a query so trivially different spellings share an entry"""
+        return ' '.join(query.lower().split())
+
+    def make_key(self, source, query, limit):
+        """Build the cache key for a search"""
+        return f"{source}|{self.normalize(query)}|{limit}"
+
+    def _migrate(self, legacy_file):
+        """Import an old search_cache.json once, then move it aside"""
+        if not legacy_file or not legacy_file.exists():
+            return
+        try:
+            with open(legacy_file, 'r') as f:
+                entries = json.load(f)
+            with self.lock, self.conn:
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO searches (key, time, results) VALUES (?, ?, ?)",
+                    [(key, entry['time'], json.dumps(entry['results'])) for key, entry in entries.items()]
+                )
+                self._evict()
+            os.replace(legacy_file, legacy_file.with_suffix('.json.migrated'))
+        except Exception as e:
+            print(f"Search cache error: {e}")
+
+    def _evict(self):
+        """Drop the oldest entries beyond the size cap (call with the lock held, in a transaction)"""
+        self.conn.execute(
+            "DELETE FROM searches WHERE key NOT IN (SELECT key FROM searches ORDER BY time DESC LIMIT ?)",
+            (self.max_entries,)
+        )
+
+    def get(self, source, query, limit):
+        """Return cached results, or None if missing, expired or bypassed"""
+        if not self.enabled:
+            return None
+        key = self.make_key(source, query, limit)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT results FROM searches WHERE key = ? AND time > ?", (key, time.time() - self.ttl)
+            ).fetchone()
+            if row:
+                self.hits += 1
+                return json.loads(row[0])
+            self.misses += 1
+            return None
+
+    def put(self, source, query, limit, results):
+        """Store results, evicting the oldest entries beyond the size cap"""
+        if not self.enabled:
+            return
+        key = self.make_key(source, query, limit)
+        try:
+            with self.lock, self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO searches (key, time, results) VALUES (?, ?, ?)",
+                    (key, time.time(), json.dumps(results))
+                )
+                self._evict()
+        except Exception as e:
+            print(f"Search cache error: {e}")
+
+    def all_results(self):
+        """Every cached result, including duplicates across queries"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT results FROM searches WHERE time > ? ORDER BY time", (time.time() - self.ttl,)
+            ).fetchall()
+        return [track for (results,) in rows for track in json.loads(results)]
+
+    def clear(self):
+        """Drop every cached result"""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM searches")
+
+    def close(self):
+        """Close the database"""
+        with self.lock:
+            self.conn.close()
+
+
+def url_expiry(url):
+    """Unix time a signed stream URL stops working, or None if it isn't signed"""
+    match = EXPIRE_PATTERN.search(url or '')
+    return int(match.group(1)) if match else None
+
+
+class StreamInfoCache:
+    """In-memory cache of extracted stream info, valid until its signed URLs expire"""
+
+    def __init__(self, max_entries=DEFAULT_STREAM_ENTRIES):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, video_id):
+        """Return cached info for a video, or None if missing or about to expire"""
+        with self.lock:
+            entry = self.entries.get(video_id)
+            if entry and entry[0] - STREAM_EXPIRY_MARGIN > time.time():
+                self.hits += 1
+                return entry[1]
+            self.entries.pop(video_id, None)
+            self.misses += 1
+            return None
+
+    def put(self, video_id, info):
+        """Store extracted info until the earliest expiry of its URLs"""
+        urls = [info.get('url')] + [f.get('url') for f in info.get('requested_formats') or []]
+        expiries = [e for e in map(url_expiry, urls) if e]
+        expires = min(expiries) if expiries else time.time() + DEFAULT_STREAM_TTL
+        with self.lock:
+            self.entries.pop(video_id, None)
+            self.entries[video_id] = (expires, info)
+            while len(self.entries) > self.max_entries:
+                del self.entries[next(iter(self.entries))]
+
+    def invalidate(self, video_id):
+        """Drop a video whose URLs stopped working early"""
+        with self.lock:
+            self.entries.pop(video_id, None)
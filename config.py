@@ -4,6 +4,7 @@ from pathlib import Path
 
 CONFIG_DIR = Path.home() / ".music_player"
 CONFIG_FILE = CONFIG_DIR / "config.json"
+# Only read once, to migrate playlists into the playlist database
 PLAYLISTS_FILE = CONFIG_DIR / "playlists.json"
 CACHE_DIR = CONFIG_DIR / "cache"
 
@@ -30,7 +31,24 @@ def load_config():
         "settings": {
             "default_volume": 50,
             "auto_play_next": True,
-            "results_per_page": 20
+            "results_per_page": 20,
+            "cache_size_mb": 1024,
+            "cache_policy": "lru",
+            "prefetch_count": 2,
+            "prefetch_workers": 2,
+            "streaming": False,
+            "stream_buffer_ms": 4000,
+            "search_cache_ttl": 86400,
+            "search_cache_entries": 500,
+            "search_timeout": 8,
+            "crossfade_ms": 0,
+            "startup_budget_ms": 300,
+            "tracing": False,
+            "album_art": True,
+            "import_workers": 4,
+            "import_rate": 5,
+            "download_workers": 2,
+            "offline": False
         }
     }
 
@@ -39,17 +57,3 @@ def save_config(config):
     ensure_config_dir()
     with open(CONFIG_FILE, 'w') as f:
         json.dump(config, f, indent=2)
-
-def load_playlists():
-    """Load playlists from file"""
-    ensure_config_dir()
-    if PLAYLISTS_FILE.exists():
-        with open(PLAYLISTS_FILE, 'r') as f:
-            return json.load(f)
-    return {}
-
-def save_playlists(playlists):
-    """Save playlists to file"""
-    ensure_config_dir()
-    with open(PLAYLISTS_FILE, 'w') as f:
-        json.dump(playlists, f, indent=2)
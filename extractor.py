@@ -0,0 +1,42 @@
+import queue
+import threading
+from contextlib import contextmanager
+
+
+class YoutubeDLPool:
+    """Pool of long-lived YoutubeDL instances sharing one set of options"""
+
+    def __init__(self, params, size=2):
+        self.params = params
+        self.size = size
+        self.idle = queue.LifoQueue()
+        self.created = 0
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def acquire(self):
+        """Borrow an instance, creating one if the pool isn't full yet"""
+        try:
+            ydl = self.idle.get_nowait()
+        except queue.Empty:
+            ydl = None
+            with self.lock:
+                if self.created < self.size:
+                    # yt-dlp takes a while to import, so wait until it is needed
+                    import yt_dlp
+                    self.created += 1
+                    ydl = yt_dlp.YoutubeDL(self.params)
+            if ydl is None:
+                ydl = self.idle.get()
+        try:
+            yield ydl
+        finally:
+            self.idle.put(ydl)
+
+    def close(self):
+        """Close every idle instance"""
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
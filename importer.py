@@ -0,0 +1,147 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from track import Track
+from tracing import tracer
+from jobs import check_cancelled
+
+# Tracks resolved and written per transaction; an interrupted import loses at most one batch
+BATCH_SIZE = 50
+
+# Seconds between progress reports
+PROGRESS_INTERVAL = 5
+
+
+class RateLimiter:
+    """Spaces calls out to at most `rate` per second across threads (0 means no limit)"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.next_at = time.monotonic()
+
+    def wait(self):
+        """Block until the caller may make its next call"""
+        if self.rate <= 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            at = max(self.next_at, now)
+            self.next_at = at + 1 / self.rate
+        if at > now:
+            time.sleep(at - now)
+
+
+class ImportProgress:
+    """Counts for one import run, shared by its workers"""
+
+    def __init__(self, total, done):
+        self.total = total
+        self.done = done
+        self.lock = threading.Lock()
+        self.imported = 0
+        self.matched = 0
+        self.known = 0
+        self.searched = 0
+        self.unmatched = 0
+        # Playlist items that aren't tracks (local files, removed tracks), counted on every run
+        self.dropped = 0
+        self.started = time.perf_counter()
+        self.reported = self.started
+
+    def add(self, field):
+        with self.lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    @property
+    def position(self):
+        """Tracks in the local playlist so far, including those from earlier runs"""
+        return self.done + self.imported
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rate(self):
+        """Tracks imported per second in this run"""
+        return self.imported / self.elapsed if self.elapsed else 0.0
+
+    def report_due(self):
+        """True at most once every PROGRESS_INTERVAL seconds"""
+        now = time.perf_counter()
+        if now - self.reported < PROGRESS_INTERVAL:
+            return False
+        self.reported = now
+        return True
+
+
+class PlaylistImporter:
+    """Copies a Spotify playlist into the playlist store, resolving each track to YouTube on a bounded, rate-limited pool"""
+
+    def __init__(self, store, resolver, workers=4, rate=5):
+        self.store = store
+        self.resolver = resolver
+        self.workers = workers
+        self.limiter = RateLimiter(rate)
+
+    def run(self, source_id, name, pages, total, on_batch=None):
+        """Import (or resume importing) pages of tracks into playlist `name`; None if the name is taken"""
+        # The playlist's length in the store is the checkpoint: each batch is written in
+        # one transaction, so an interrupted import resumes after its last full batch
+        done = self.store.start_import(source_id, name, total)
+        if done is None:
+            return None
+        progress = ImportProgress(total, done)
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="import") as executor:
+            skip = done
+            for page in pages:
+                progress.dropped += page.dropped
+                # Pages already imported by an earlier run
+                if skip >= len(page):
+                    skip -= len(page)
+                    continue
+                page, skip = page[skip:], 0
+                for start in range(0, len(page), BATCH_SIZE):
+                    check_cancelled()
+                    with tracer.span('import.batch'):
+                        searched = progress.searched
+                        tracks = list(executor.map(lambda track: self._import_track(track, progress),
+                                                   page[start:start + BATCH_SIZE]))
+                        # New resolutions reach disk before the tracks that rely on them
+                        if progress.searched != searched:
+                            self.resolver.index.save()
+                        self.store.extend(name, tracks)
+                    progress.imported += len(tracks)
+                    # The playlist may have grown since it was listed
+                    progress.total = max(progress.total, progress.position + progress.dropped)
+                    if on_batch:
+                        on_batch(tracks, progress)
+
+        # Every page was read (a page that can't be fetched raises PageFetchError and
+        # keeps the checkpoint), so the import is complete even if items were dropped
+        self.store.finish_import(source_id)
+        return progress
+
+    def _import_track(self, track, progress):
+        """The track to store: a YouTube track under Spotify's metadata, or the Spotify track if unmatched"""
+        if track.source != 'spotify':
+            return track
+        if self.resolver.is_resolved(track):
+            progress.add('known')
+        else:
+            self.limiter.wait()
+            progress.add('searched')
+        try:
+            match = self.resolver.resolve(track, save=False)
+        except Exception as e:
+            print(f"Import error: {e}")
+            match = None
+        # Matches too weak to be remembered stay Spotify tracks and are resolved again at play time
+        if match is None or self.resolver.index.get(track) is None:
+            progress.add('unmatched')
+            return track
+        progress.add('matched')
+        return Track(match.id, track.title, track.artist, track.album,
+                     match.duration_ms or track.duration_ms, track.thumbnail, match.source, track.isrc)
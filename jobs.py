@@ -0,0 +1,143 @@
+import time
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+_local = threading.local()
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's worker thread once the job has been cancelled"""
+
+
+def current_job():
+    """The job whose work is running on this thread, if any"""
+    return getattr(_local, 'job', None)
+
+
+def check_cancelled():
+    """Stop the calling job if it was cancelled; call this between slow steps"""
+    job = current_job()
+    if job is not None and job.cancel_event.is_set():
+        raise JobCancelled()
+
+
+class Job:
+    """One command in flight"""
+
+    def __init__(self, job_id, description, lane=None, bulk=False):
+        self.id = job_id
+        self.description = description
+        self.lane = lane
+        self.bulk = bulk
+        self.state = 'queued'
+        self.created = time.time()
+        self.cancel_event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    @property
+    def elapsed(self):
+        return time.time() - self.created
+
+
+class JobManager:
+    """Runs slow commands as asyncio tasks on a background loop, with their blocking work in a thread pool"""
+
+    def __init__(self, workers=4, bulk_workers=2):
+        # asyncio is imported here so it stays off the startup path
+        import asyncio
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        # Long batch work (playlist downloads, imports) queues here, so it can never
+        # take every thread from play and search
+        self.bulk_executor = ThreadPoolExecutor(max_workers=bulk_workers, thread_name_prefix="bulk-job")
+        self.loop = asyncio.new_event_loop()
+        self.loop.set_default_executor(self.executor)
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self._ids = itertools.count(1)
+        self.thread = threading.Thread(target=self.loop.run_forever, name="jobs", daemon=True)
+        self.thread.start()
+
+    def submit(self, description, fn, *args, lane=None, bulk=False):
+        """Start fn(*args) as a job from any thread; a newer job in the same lane cancels older ones"""
+        import asyncio
+        job = Job(next(self._ids), description, lane, bulk)
+        with self.lock:
+            if lane:
+                for other in self.jobs.values():
+                    if other.lane == lane:
+                        self._cancel(other)
+            self.jobs[job.id] = job
+        asyncio.run_coroutine_threadsafe(self._run(job, fn, args), self.loop)
+        return job
+
+    async def _run(self, job, fn, args):
+        import asyncio
+        try:
+            executor = self.bulk_executor if job.bulk else self.executor
+            await self.loop.run_in_executor(executor, self._call, job, fn, args)
+            job.state = 'done'
+        except (asyncio.CancelledError, JobCancelled):
+            job.state = 'cancelled'
+        except Exception as e:
+            job.state = 'failed'
+            print(f"{job.description} failed: {e}")
+        finally:
+            with self.lock:
+                self.jobs.pop(job.id, None)
+
+    def _call(self, job, fn, args):
+        """Run a job's work on a pool thread, unless it was cancelled while queued"""
+        if job.cancelled:
+            raise JobCancelled()
+        job.state = 'running'
+        _local.job = job
+        try:
+            return fn(*args)
+        finally:
+            _local.job = None
+
+    def _cancel(self, job):
+        job.cancel_event.set()
+        if job.state == 'queued':
+            job.state = 'cancelled'
+        elif job.state == 'running':
+            # The worker stops at its next check_cancelled()
+            job.state = 'cancelling'
+
+    def cancel(self, job_id):
+        """Cancel a job by id; returns False if there is no such job"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return False
+            self._cancel(job)
+            return True
+
+    def cancel_lane(self, lane):
+        """Cancel every job in a lane, e.g. a track still loading when playback is stopped"""
+        with self.lock:
+            for job in self.jobs.values():
+                if job.lane == lane:
+                    self._cancel(job)
+
+    def cancel_all(self):
+        """Cancel every job in flight"""
+        with self.lock:
+            for job in self.jobs.values():
+                self._cancel(job)
+
+    def active(self):
+        """Jobs still in flight, oldest first"""
+        with self.lock:
+            return sorted(self.jobs.values(), key=lambda job: job.id)
+
+    def shutdown(self):
+        """Cancel everything and stop the loop and its pool"""
+        self.cancel_all()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.bulk_executor.shutdown(wait=False, cancel_futures=True)
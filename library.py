@@ -0,0 +1,126 @@
+import re
+import json
+import time
+import sqlite3
+import threading
+from config import CACHE_DIR
+from track import Track
+
+LIBRARY_DB_FILE = CACHE_DIR / "library.db"
+
+# Local hits shown ahead of remote results in a normal search
+MERGED_LOCAL_RESULTS = 10
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracks (
+    rowid INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    track TEXT NOT NULL,
+    plays INTEGER NOT NULL DEFAULT 0,
+    last_played REAL,
+    added REAL NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS tracks_fts USING fts5(
+    title, artist, album, tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+"""
+
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def _match_query(query):
+    """Turn free text into an FTS5 query matching every word as a prefix"""
+    return ' '.join(f'"{token}"*' for token in TOKEN_PATTERN.findall(query.lower()))
+
+
+class LibraryIndex:
+    """Local full-text index of tracks from playlists, play history and past searches"""
+
+    def __init__(self, path=LIBRARY_DB_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    @staticmethod
+    def make_key(track):
+        return f"{track.source}:{track.id}"
+
+    def _insert(self, track, now):
+        """Add a track and its text to the index unless it is already there"""
+        cursor = self.conn.execute(
+            "INSERT OR IGNORE INTO tracks (key, track, added) VALUES (?, ?, ?)",
+            (self.make_key(track), json.dumps(track.to_dict()), now)
+        )
+        if cursor.rowcount:
+            self.conn.execute(
+                "INSERT INTO tracks_fts (rowid, title, artist, album) VALUES (?, ?, ?, ?)",
+                (cursor.lastrowid, track.title, track.artist, track.album)
+            )
+        return cursor.rowcount
+
+    def add(self, tracks):
+        """Index new tracks in one transaction; returns how many were new"""
+        now = time.time()
+        with self.lock, self.conn:
+            return sum(self._insert(track, now) for track in tracks if track.id)
+
+    def record_play(self, track):
+        """Index a played track and bump its play count"""
+        if not track or not track.id:
+            return
+        now = time.time()
+        with self.lock, self.conn:
+            self._insert(track, now)
+            self.conn.execute(
+                "UPDATE tracks SET plays = plays + 1, last_played = ? WHERE key = ?",
+                (now, self.make_key(track))
+            )
+
+    def search(self, query, limit=20):
+        """Best local matches for a query, favouring often played tracks on ties"""
+        match = _match_query(query)
+        if not match:
+            return []
+        with self.lock:
+            # Rank inside FTS first so only the top rows are joined
+            rows = self.conn.execute(
+                "SELECT t.track FROM (SELECT rowid, rank FROM tracks_fts WHERE tracks_fts MATCH ? "
+                "ORDER BY rank LIMIT ?) hits JOIN tracks t ON t.rowid = hits.rowid "
+                "ORDER BY hits.rank, t.plays DESC",
+                (match, limit)
+            ).fetchall()
+        return [Track.from_dict(json.loads(row[0])) for row in rows]
+
+    def count(self):
+        """Number of indexed tracks"""
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM tracks").fetchone()[0]
+
+    def needs_build(self):
+        """Whether the index has never been filled from existing data"""
+        with self.lock:
+            return self.conn.execute("PRAGMA user_version").fetchone()[0] == 0
+
+    def build(self, playlists, search_cache):
+        """Index every saved playlist and cached search result once"""
+        added = 0
+        for name in playlists.counts():
+            added += self.add(playlists.tracks(name) or [])
+        added += self.add(Track.from_dict(track) for track in search_cache.all_results())
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA user_version = 1")
+        return added
+
+    def build_in_background(self, playlists, search_cache):
+        """Fill a new index without delaying startup"""
+        thread = threading.Thread(target=self.build, args=(playlists, search_cache), daemon=True)
+        thread.start()
+        return thread
+
+    def close(self):
+        """Close the database"""
+        with self.lock:
+            self.conn.close()
@@ -1,107 +1,244 @@
 #!/usr/bin/env python3
+import os
 import sys
 import time
+import threading
+import subprocess
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from rich.console import Console
-from music_sources import YouTubeMusicSource, SpotifySource
-from player import MusicPlayer
+from music_sources import YouTubeMusicSource, SpotifySource, PageFetchError
+from cache import AudioCache, SearchCache
+from prefetch import Prefetcher
+from resolver import TrackResolver
 from ui import (
     display_search_results, display_now_playing, display_playlists,
-    display_menu, clear_screen, get_input, console
+    display_menu, clear_screen, get_input, console, LivePrompt, display_stats, display_jobs
 )
-from config import load_config, save_config, load_playlists, save_playlists
+from config import load_config, save_config
+from store import PlaylistStore
+from track import parse_duration, format_duration
+from library import LibraryIndex, MERGED_LOCAL_RESULTS
+from tracing import tracer
+from jobs import check_cancelled, JobCancelled
+from artwork import ArtworkCache
+
+# Modules that are slow to import and must not be loaded before the first prompt
+DEFERRED_MODULES = ('pygame', 'yt_dlp', 'ytmusicapi', 'spotipy', 'PIL', 'requests', 'asyncio')
 
 class MusicPlayerApp:
     def __init__(self):
-        self.player = MusicPlayer()
-        self.youtube = YouTubeMusicSource()
-        self.spotify = SpotifySource()
+        self.startup_phases = []
+        with self._phase("config"):
+            self.config = load_config()
+            settings = self.config.get('settings', {})
+            if settings.get('tracing', False):
+                tracer.enable()
+        with self._phase("caches"):
+            self.audio_cache = AudioCache(
+                max_size_mb=settings.get('cache_size_mb', 1024),
+                policy=settings.get('cache_policy', 'lru')
+            )
+            self.search_cache = SearchCache(
+                ttl=settings.get('search_cache_ttl', 86400),
+                max_entries=settings.get('search_cache_entries', 500)
+            )
+        # Sources only set themselves up here; their clients (and Spotify's
+        # login) are created the first time they are actually used
+        with self._phase("sources"):
+            self.youtube = YouTubeMusicSource(search_cache=self.search_cache)
+            self.spotify = SpotifySource(search_cache=self.search_cache)
+        # The player (pygame and its mixer) is created on first use
+        self._player = None
+        self._player_lock = threading.Lock()
+        # Slow commands run as jobs on a background event loop, also started on first use
+        self._jobs = None
         self.search_results = []
-        self.playlists = load_playlists()
-        self.config = load_config()
+        self.search_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="search")
+        with self._phase("resolver"):
+            self.resolver = TrackResolver(self.youtube)
+            self.resolver.offline = settings.get('offline', False)
+            self.prefetcher = Prefetcher(
+                lambda video_id, cancelled: self.player.fetch(video_id, cancelled=cancelled),
+                resolve=self.resolver.resolve,
+                lookahead=settings.get('prefetch_count', 2),
+                workers=settings.get('prefetch_workers', 2),
+                on_ready=lambda track: self.queue_upcoming()
+            )
+        with self._phase("playlists"):
+            self.playlists = PlaylistStore()
+        with self._phase("library"):
+            self.library = LibraryIndex()
+            if self.library.needs_build():
+                self.library.build_in_background(self.playlists, self.search_cache)
+        # Album art is downloaded in the background the first time a track is shown
+        self.artwork = ArtworkCache()
+        self.artwork.offline = settings.get('offline', False)
+        # Reads commands under a live now playing panel; never creates the player itself
+        self.prompt = LivePrompt(lambda: self._player, self.shown_artwork)
         self.running = True
         self.current_page = 1
         self.results_per_page = self.config.get('settings', {}).get('results_per_page', 20)
+    
+    @contextmanager
+    def _phase(self, name):
+        """Time a step of startup for --profile-startup"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.startup_phases.append((name, (time.perf_counter() - started) * 1000))
+    
+    @property
+    def player(self):
+        """The audio player, created the first time something needs it"""
+        if self._player is None:
+            with self._player_lock:
+                if self._player is None:
+                    self._player = self._create_player()
+        return self._player
+    
+    @property
+    def jobs(self):
+        """The job runner for slow commands, started the first time one is issued"""
+        if self._jobs is None:
+            with self._player_lock:
+                if self._jobs is None:
+                    from jobs import JobManager
+                    self._jobs = JobManager()
+        return self._jobs
+    
+    def run_job(self, description, fn, *args, lane=None, bulk=False):
+        """Run a slow command in the background so the prompt comes straight back (bulk=True for long batch work)"""
+        return self.jobs.submit(description, fn, *args, lane=lane, bulk=bulk)
+    
+    def play_in_background(self, track):
+        """Start playing a track as a job, replacing any track still loading"""
+        return self.run_job(f"play {track.title}", self.play_track_from_info, track, lane='playback')
+    
+    def shown_artwork(self):
+        """The album art cache, or None when art is turned off"""
+        return self.artwork if self.config.get('settings', {}).get('album_art', True) else None
+    
+    def _create_player(self):
+        """Import pygame, open the mixer and start the auto-play thread"""
+        from player import MusicPlayer
+        settings = self.config.get('settings', {})
+        player = MusicPlayer(cache=self.audio_cache, stream_resolver=self.youtube.get_stream_url,
+                             info_cache=self.youtube.stream_info)
+        player.streaming = settings.get('streaming', False)
+        player.stream_buffer_ms = settings.get('stream_buffer_ms', 4000)
+        player.crossfade_ms = settings.get('crossfade_ms', 0)
+        player.offline = settings.get('offline', False)
+        player.on_track_change = self._on_track_change
         
         # Set default volume
-        default_vol = self.config.get('settings', {}).get('default_volume', 50)
-        self.player.set_volume(default_vol)
+        player.set_volume(settings.get('default_volume', 50))
         
         # Start auto-play thread
-        import threading
-        self.auto_play_thread = threading.Thread(target=self._auto_play_loop, daemon=True)
+        self.auto_play_thread = threading.Thread(target=self._auto_play_loop, args=(player,), daemon=True)
         self.auto_play_thread.start()
+        return player
     
-    def _auto_play_loop(self):
+    def _auto_play_loop(self, player):
         """Background thread to auto-play next track when current ends"""
-        import time
-        last_track_id = None
-        track_start_time = 0
-        
         while self.running:
-            try:
-                current_track = self.player.current_track
-                is_playing = self.player.is_playing_state()
-                is_paused = self.player.is_paused
-                has_playlist = len(self.player.playlist) > 0
-                
-                # Track the current track ID
-                current_track_id = current_track.get('id') if current_track else None
-                
-                # Detect if track changed (new track started)
-                if current_track_id and current_track_id != last_track_id:
-                    last_track_id = current_track_id
-                    track_start_time = time.time()
-                
-                # Only auto-play if:
-                # 1. Auto-play is enabled
-                # 2. There's a current track
-                # 3. Music is not playing (track ended)
-                # 4. NOT manually paused by user
-                # 5. There's a playlist loaded
-                # 6. Track has been playing for at least 5 seconds (to avoid triggering on manual stops)
-                if (self.config.get('settings', {}).get('auto_play_next', True) and
-                    current_track and 
-                    not is_playing and 
-                    not is_paused and
-                    has_playlist and
-                    time.time() - track_start_time > 5):
-                    
-                    # Wait a moment to confirm it's really finished
-                    time.sleep(1)
-                    
-                    # Triple check: still not playing, NOT paused, still has track, still has playlist
-                    if (not self.player.is_playing_state() and 
-                        not self.player.is_paused and
-                        self.player.current_track and 
-                        len(self.player.playlist) > 0):
-                        
-                        # Play next track
-                        track = self.player.play_next()
-                        if track:
-                            self.play_track_from_info(track)
-                            # Reset the track start time for the new track
-                            track_start_time = time.time()
-                
-            except Exception as e:
-                pass
+            # Blocks until the player reports that a track ended on its own;
+            # manual stops, pauses and track changes never show up here
+            finished = player.wait_for_track_end()
+            if finished is None or not self.running:
+                continue
             
-            time.sleep(2)
+            if self.config.get('settings', {}).get('auto_play_next', True) and finished.playlist:
+                try:
+                    # Only advances if nothing moved the playlist since the track ended
+                    track = player.play_next(after=finished.index)
+                    if track:
+                        # Queued like a typed 'next', so it can't race a command
+                        self.play_in_background(track)
+                except Exception as e:
+                    console.print(f"[red]Auto-play error: {e}[/red]")
+    
+    def _on_track_change(self, track):
+        """Called by the player after a gapless or crossfaded transition"""
+        self.library.record_play(track)
+        self.prefetch_upcoming()
+        self.queue_upcoming()
+    
+    def search_local(self, query):
+        """Search only the local library, without touching the network"""
+        started = time.perf_counter()
+        self.search_results = self.library.search(query, limit=self.results_per_page * 5)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.current_page = 1
+        if not self.search_results:
+            console.print("[yellow]No local results[/yellow]")
+            return
+        self.display_paginated_results()
+        console.print(f"[dim]{len(self.search_results)} local results in {elapsed_ms:.1f} ms[/dim]")
     
-    def search_music(self, query):
+    def search_music(self, query, use_cache=True):
         """Search for music across sources"""
         console.print(f"[cyan]Searching for: {query}[/cyan]")
         
-        # Search YouTube Music (primary source for playback)
-        yt_results = self.youtube.search(query, limit=30)
-        
-        # Search Spotify if configured
-        sp_results = []
-        if self.spotify.sp:
-            sp_results = self.spotify.search(query, limit=20)
-        
-        self.search_results = yt_results + sp_results
+        # YouTube Music is the primary source for playback; Spotify only if it
+        # is configured and can be used without opening a login page
+        sources = [(self.youtube, 30)]
+        if self.spotify.has_session():
+            sources.append((self.spotify, 20))
+        
+        # Query all sources at once; each one gets its own deadline
+        timeout = self.config.get('settings', {}).get('search_timeout', 8)
+        traced_from = time.perf_counter()
+        started = time.time()
+        pending = {}
+        for source, limit in sources:
+            future = self.search_executor.submit(source.search, query, limit, use_cache)
+            pending[future] = (source, started + timeout)
+        
+        # Tracks already in the library are shown straight away, ahead of remote ones
+        with tracer.span('search.local'):
+            self.search_results = self.library.search(query, limit=MERGED_LOCAL_RESULTS)
+        seen = {(track.source, track.id) for track in self.search_results}
         self.current_page = 1
-        self.display_paginated_results()
+        # Rows are printed as each source answers rather than redrawn in a Live: the
+        # prompt already owns the terminal's live display while this runs as a job
+        shown = 0
+        if self.search_results:
+            shown = self.print_new_results(shown)
+        while pending:
+            next_deadline = min(deadline for _, deadline in pending.values())
+            done, _ = wait(pending, timeout=max(0, next_deadline - time.time()),
+                           return_when=FIRST_COMPLETED)
+            
+            # A newer search replaced this one; stop showing its results
+            check_cancelled()
+            for future in done:
+                source, _ = pending.pop(future)
+                try:
+                    results = future.result()
+                except Exception as e:
+                    console.print(f"[yellow]{source.name} search failed: {e}[/yellow]")
+                    continue
+                # Faster sources are shown first; slower ones fill in below
+                if results:
+                    self.library.add(results)
+                    results = [t for t in results if (t.source, t.id) not in seen]
+                    seen.update((t.source, t.id) for t in results)
+                    self.search_results.extend(results)
+                    shown = self.print_new_results(shown)
+            
+            # Drop sources that missed their deadline
+            for future, (source, deadline) in list(pending.items()):
+                if not future.done() and time.time() >= deadline:
+                    del pending[future]
+                    console.print(f"[yellow]{source.name} did not answer within {timeout}s, skipped[/yellow]")
+        if self.search_results:
+            console.print(self.render_results_footer())
+        tracer.record('search.total', (time.perf_counter() - traced_from) * 1000)
+        
+        if not self.search_results:
+            console.print("[yellow]No results[/yellow]")
     
     def play_track(self, index):
         """Play a track from search results"""
@@ -109,8 +246,12 @@ class MusicPlayerApp:
             console.print("[red]Invalid track number[/red]")
             return
         
+        started = time.perf_counter()
         track = self.search_results[index - 1]
-        console.print(f"[cyan]Loading: {track['title']} by {track['artist']}[/cyan]")
+        if self.player.offline and not self.available_offline(track):
+            console.print(f"[yellow]Offline: {track.title} isn't downloaded[/yellow]")
+            return
+        console.print(f"[cyan]Loading: {track.title} by {track.artist}[/cyan]")
         
         # Check if this track is part of the current playlist
         track_in_playlist = False
@@ -118,8 +259,8 @@ class MusicPlayerApp:
             try:
                 # Find the track in the playlist
                 for i, pl_track in enumerate(self.player.playlist):
-                    if pl_track['id'] == track['id']:
-                        self.player.current_index = i - 1  # Set to one before so play_next works
+                    if pl_track.id == track.id:
+                        self.player.set_index(i - 1)  # Set to one before so play_next works
                         track_in_playlist = True
                         break
             except:
@@ -127,33 +268,31 @@ class MusicPlayerApp:
         
         # If track is NOT in current playlist, this is a standalone play - clear playlist
         if not track_in_playlist:
-            self.player.playlist = []
-            self.player.current_index = -1
+            self.player.load_playlist([])
         
         # If Spotify track, search YouTube for playback
-        if track['source'] == 'spotify':
-            search_query = f"{track['title']} {track['artist']}"
-            yt_results = self.youtube.search(search_query, limit=1)
-            if yt_results:
-                track = yt_results[0]
-            else:
+        if track.source == 'spotify':
+            with tracer.span('play.resolve'):
+                track = self.resolver.resolve(track)
+            if not track:
                 console.print("[red]Could not find playback source[/red]")
                 return
         
-        # Play using video ID
-        if self.player.play(track['id'], track):
-            time.sleep(1)
-            display_now_playing(track, self.player)
+        # Play using video ID, unless a newer command took over meanwhile
+        check_cancelled()
+        if self.player.play(track.id, track):
+            tracer.record('play.total', (time.perf_counter() - started) * 1000)
+            self.library.record_play(track)
+            self.prefetch_upcoming()
+            self.queue_upcoming()
         else:
             console.print("[red]Playback failed[/red]")
     
     def create_playlist(self, name):
         """Create a new playlist"""
-        if name in self.playlists:
+        if not self.playlists.create(name):
             console.print(f"[yellow]Playlist '{name}' already exists[/yellow]")
         else:
-            self.playlists[name] = []
-            save_playlists(self.playlists)
             console.print(f"[green]✓ Created playlist: {name}[/green]")
     
     def add_to_playlist(self, name):
@@ -162,30 +301,30 @@ class MusicPlayerApp:
             console.print("[yellow]No track currently playing[/yellow]")
             return
         
-        if name not in self.playlists:
+        if not self.playlists.append(name, self.player.current_track):
             console.print(f"[red]Playlist '{name}' not found[/red]")
             return
+        self.library.add([self.player.current_track])
         
-        self.playlists[name].append(self.player.current_track)
-        save_playlists(self.playlists)
         console.print(f"[green]✓ Added to playlist: {name}[/green]")
     
     def show_playlists(self):
         """Show all playlists"""
-        display_playlists(self.playlists)
+        display_playlists(self.playlists.counts())
     
     def load_playlist(self, name):
         """Load and play a playlist"""
-        if name not in self.playlists:
+        tracks = self.playlists.tracks(name)
+        if tracks is None:
             console.print(f"[red]Playlist '{name}' not found[/red]")
             return
         
-        tracks = self.playlists[name]
         if not tracks:
             console.print("[yellow]Playlist is empty[/yellow]")
             return
         
         self.player.load_playlist(tracks)
+        self.resolver.resolve_in_background(tracks)
         console.print(f"[green]✓ Loaded playlist: {name} ({len(tracks)} tracks)[/green]")
         
         # Play first track
@@ -193,25 +332,74 @@ class MusicPlayerApp:
         if track:
             self.play_track_from_info(track)
     
+    def prefetch_upcoming(self):
+        """Start downloading the next tracks of the playlist in the background"""
+        self.prefetcher.update(self.player.playlist, self.player.current_index)
+        # The next track's art too, so the panel has it as soon as that track starts
+        index = self.player.current_index + 1
+        if self.shown_artwork() and index < len(self.player.playlist):
+            self.artwork.request(self.player.playlist[index].thumbnail)
+    
+    def queue_upcoming(self):
+        """Line up the next playlist track in the player if it is already resolved and cached"""
+        if not self.config.get('settings', {}).get('auto_play_next', True):
+            return
+        index = self.player.current_index + 1
+        if index >= len(self.player.playlist):
+            return
+        track = self.player.playlist[index]
+        if self.resolver.is_resolved(track):
+            self.player.queue_next(self.resolver.resolve(track), index)
+    
+    def available_offline(self, track):
+        """Whether a track can play without the network: already matched (if from Spotify) and downloaded"""
+        play_track = self.resolver.resolve(track) if self.resolver.is_resolved(track) else None
+        return play_track is not None and self.player.is_cached(play_track.id)
+    
+    def _first_available(self, track):
+        """In offline mode, this track or, for a playlist track, the next downloaded one after it"""
+        skipped = 0
+        while track and not self.available_offline(track):
+            skipped += 1
+            index = self.player.current_index
+            in_playlist = 0 <= index < len(self.player.playlist) and self.player.playlist[index] is track
+            if not in_playlist:
+                console.print(f"[yellow]Offline: {track.title} isn't downloaded[/yellow]")
+                return None
+            # Moves the playlist on, unless a newer command already did
+            track = self.player.play_next(after=index)
+        if skipped:
+            console.print(f"[yellow]Offline: skipped {skipped} track(s) that aren't downloaded[/yellow]")
+            if not track:
+                console.print("[yellow]No downloaded tracks left in the playlist[/yellow]")
+        return track
+    
     def play_track_from_info(self, track):
         """Play a track from track info"""
+        started = time.perf_counter()
+        if self.player.offline:
+            track = self._first_available(track)
+            if not track:
+                return
         # If Spotify track, search YouTube for playback
         play_track = track
-        if track.get('source') == 'spotify':
-            console.print(f"[cyan]Searching YouTube for: {track['title']} by {track['artist']}[/cyan]")
-            search_query = f"{track['title']} {track['artist']}"
-            yt_results = self.youtube.search(search_query, limit=1)
-            if yt_results:
-                play_track = yt_results[0]
-            else:
-                console.print(f"[red]Could not find YouTube version of: {track['title']}[/red]")
+        if track.source == 'spotify':
+            if not self.resolver.is_resolved(track):
+                console.print(f"[cyan]Searching YouTube for: {track.title} by {track.artist}[/cyan]")
+            with tracer.span('play.resolve'):
+                play_track = self.resolver.resolve(track)
+            if not play_track:
+                console.print(f"[red]Could not find YouTube version of: {track.title}[/red]")
                 return
         
-        if self.player.play(play_track['id'], play_track):
-            time.sleep(1)
-            display_now_playing(play_track, self.player)
+        check_cancelled()
+        if self.player.play(play_track.id, play_track):
+            tracer.record('play.total', (time.perf_counter() - started) * 1000)
+            self.library.record_play(play_track)
+            self.prefetch_upcoming()
+            self.queue_upcoming()
         else:
-            console.print(f"[red]Failed to play: {track['title']}[/red]")
+            console.print(f"[red]Failed to play: {track.title}[/red]")
     
     def show_spotify_playlists(self):
         """Show Spotify playlists"""
@@ -236,20 +424,37 @@ class MusicPlayerApp:
         console.print(table)
         self.spotify_playlists = playlists
     
-    def display_paginated_results(self):
-        """Display search results with pagination"""
-        if not self.search_results:
-            console.print("[yellow]No results[/yellow]")
-            return
+    def render_results_page(self):
+        """Build the current page of search results as a renderable"""
+        from rich.console import Group
         
-        total_pages = (len(self.search_results) - 1) // self.results_per_page + 1
         start_idx = (self.current_page - 1) * self.results_per_page
         end_idx = min(start_idx + self.results_per_page, len(self.search_results))
         
+        return Group(self.render_results_rows(start_idx, end_idx), self.render_results_footer())
+    
+    def render_results_footer(self):
+        """Page position and total below a page of search results"""
+        total_pages = (len(self.search_results) - 1) // self.results_per_page + 1
+        footer = f"\n[dim]Page {self.current_page}/{total_pages} | Total: {len(self.search_results)} tracks[/dim]"
+        if total_pages > 1:
+            footer += "\n[dim]Use 'page <number>' to navigate pages[/dim]"
+        return footer
+    
+    def print_new_results(self, shown):
+        """Print results added since the first `shown` that fall on the first page; returns the new count shown"""
+        end_idx = min(len(self.search_results), self.results_per_page)
+        if end_idx > shown:
+            console.print(self.render_results_rows(shown, end_idx))
+        return max(shown, end_idx)
+    
+    def render_results_rows(self, start_idx, end_idx):
+        """Build a table of search results start_idx..end_idx, numbered by position in the full list"""
+        from rich.table import Table
+        
         page_results = self.search_results[start_idx:end_idx]
         
         # Adjust display indices to show actual position in full list
-        from rich.table import Table
         table = Table(show_header=True, header_style="bold magenta")
         table.add_column("#", style="dim", width=4)
         table.add_column("Title", style="cyan")
@@ -261,17 +466,21 @@ class MusicPlayerApp:
         for idx, track in enumerate(page_results, start_idx + 1):
             table.add_row(
                 str(idx),
-                track['title'][:40],
-                track['artist'][:30],
-                track['album'][:30],
-                track['duration'],
-                track['source']
+                track.title[:40],
+                track.artist[:30],
+                track.album[:30],
+                track.duration,
+                track.source
             )
+        return table
+    
+    def display_paginated_results(self):
+        """Display search results with pagination"""
+        if not self.search_results:
+            console.print("[yellow]No results[/yellow]")
+            return
         
-        console.print(table)
-        console.print(f"\n[dim]Page {self.current_page}/{total_pages} | Total: {len(self.search_results)} tracks[/dim]")
-        if total_pages > 1:
-            console.print("[dim]Use 'page <number>' to navigate pages[/dim]")
+        console.print(self.render_results_page())
     
     def show_spotify_playlist_tracks(self, index):
         """Show tracks in a Spotify playlist"""
@@ -285,12 +494,14 @@ class MusicPlayerApp:
         
         playlist = self.spotify_playlists[index - 1]
         console.print(f"[cyan]Loading tracks from: {playlist['name']}...[/cyan]")
-        tracks = self.spotify.get_playlist_tracks(playlist['id'])
+        tracks = self.read_spotify_playlist(playlist)
+        check_cancelled()
         
         if tracks:
             # Store as search results so user can play individual tracks
             self.search_results = tracks
             self.player.load_playlist(tracks)
+            self.resolver.resolve_in_background(tracks)
             self.current_page = 1
             self.display_paginated_results()
             console.print(f"\n[green]✓ Loaded {len(tracks)} tracks[/green]")
@@ -309,18 +520,170 @@ class MusicPlayerApp:
             return
         
         playlist = self.spotify_playlists[index - 1]
-        tracks = self.spotify.get_playlist_tracks(playlist['id'])
+        pages = self.spotify.iter_playlist_tracks(playlist['id'])
+        try:
+            tracks = next((page for page in pages if page), [])
+        except PageFetchError as e:
+            console.print(f"[red]Could not load {playlist['name']}: {e}[/red]")
+            return
+        check_cancelled()
         
         if tracks:
             self.search_results = tracks
-            self.player.load_playlist(tracks)
-            console.print(f"[green]✓ Loaded: {playlist['name']} ({len(tracks)} tracks)[/green]")
+            load = self.player.load_playlist(tracks)
+            self.resolver.resolve_in_background(tracks)
+            console.print(f"[green]✓ Loaded: {playlist['name']} ({len(tracks)} of {playlist['tracks']} tracks)[/green]")
+            
+            # Later pages keep arriving while the first track plays
+            threading.Thread(target=self._append_playlist_pages, args=(pages, load, tracks, playlist),
+                             daemon=True).start()
             
             # Play first track
             track = self.player.play_next()
             if track:
                 self.play_track_from_info(track)
     
+    def import_spotify_playlist(self, index, name=None):
+        """Copy a Spotify playlist into a local playlist, resolving every track to YouTube"""
+        if not hasattr(self, 'spotify_playlists'):
+            console.print("[yellow]Run 'spotify playlists' first[/yellow]")
+            return
+        
+        if index < 1 or index > len(self.spotify_playlists):
+            console.print("[red]Invalid playlist number[/red]")
+            return
+        
+        from importer import PlaylistImporter
+        playlist = self.spotify_playlists[index - 1]
+        # A rerun without a name resumes into whatever playlist the interrupted import was filling
+        name = name or self.playlists.import_target(playlist['id']) or playlist['name']
+        settings = self.config.get('settings', {})
+        importer = PlaylistImporter(self.playlists, self.resolver,
+                                    workers=settings.get('import_workers', 4),
+                                    rate=settings.get('import_rate', 5))
+        
+        def on_batch(tracks, progress):
+            self.library.add(tracks)
+            if progress.report_due():
+                console.print(f"[dim]Importing '{name}': {progress.position}/{progress.total} tracks, "
+                              f"{progress.rate:.1f} tracks/s[/dim]")
+        
+        console.print(f"[cyan]Importing {playlist['name']} into '{name}'...[/cyan]")
+        pages = self.spotify.iter_playlist_tracks(playlist['id'])
+        try:
+            progress = importer.run(playlist['id'], name, pages, playlist['tracks'], on_batch=on_batch)
+        except JobCancelled:
+            console.print(f"[yellow]Import of '{name}' stopped; run 'spotify import {index}' again to resume[/yellow]")
+            raise
+        except PageFetchError as e:
+            # Every batch before the failed page is saved, so a rerun picks up from there
+            console.print(f"[yellow]Import of '{name}' stopped: {e}; "
+                          f"run 'spotify import {index}' again to resume[/yellow]")
+            return
+        
+        if progress is None:
+            console.print(f"[red]Playlist '{name}' already exists[/red]")
+            console.print(f"[dim]Use 'spotify import {index} <new name>' to import under another name[/dim]")
+            return
+        
+        resumed = f", resumed at {progress.done}" if progress.done else ""
+        console.print(f"[green]✓ Imported {playlist['name']} as '{name}': {progress.position} tracks{resumed}[/green]")
+        console.print(f"[dim]{progress.matched} matched on YouTube ({progress.known} already known), "
+                      f"{progress.unmatched} left to match at play time; {progress.searched} searches "
+                      f"in {progress.elapsed:.1f}s ({progress.rate:.1f} tracks/s)[/dim]")
+        # Pages that failed stop the import above, so only items Spotify can't give us are missing
+        if progress.dropped:
+            console.print(f"[dim]{progress.dropped} items can't be imported (local files or removed tracks)[/dim]")
+    
+    def download_for_offline(self, name, tracks):
+        """Download every track of a playlist into the audio cache so it plays offline"""
+        if self.player.offline:
+            console.print("[yellow]Downloading needs the network; use 'set offline false' first[/yellow]")
+            return
+        
+        from offline import PlaylistDownloader
+        settings = self.config.get('settings', {})
+        downloader = PlaylistDownloader(self.player, lambda track: self.resolver.resolve(track, save=False),
+                                        workers=settings.get('download_workers', 2))
+        mb = 1024 * 1024
+        
+        def on_progress(progress):
+            console.print(f"[dim]Downloading '{name}': {progress.finished}/{progress.total} tracks, "
+                          f"{progress.bytes / mb:.0f} MB, {progress.rate_mb:.1f} MB/s[/dim]")
+        
+        console.print(f"[cyan]Downloading {name} for offline play ({len(tracks)} tracks)...[/cyan]")
+        try:
+            progress = downloader.run(tracks, on_progress=on_progress)
+        except JobCancelled:
+            console.print(f"[yellow]Stopped downloading '{name}'; finished tracks stay downloaded[/yellow]")
+            raise
+        finally:
+            # Matches found along the way are saved once rather than per track
+            self.resolver.index.save()
+        
+        console.print(f"[green]✓ {progress.available} of {progress.total} tracks of '{name}' available offline[/green]")
+        console.print(f"[dim]{progress.downloaded} downloaded ({progress.downloaded_bytes / mb:.0f} MB in "
+                      f"{progress.elapsed:.1f}s, {progress.rate_mb:.1f} MB/s), {progress.cached} already cached, "
+                      f"{progress.unmatched} not found, {progress.failed} failed[/dim]")
+        if progress.full:
+            console.print(f"[yellow]The audio cache budget ({progress.budget_bytes // mb} MB) is full; "
+                          f"raise it with 'set cache_size_mb <MB>' to download the rest[/yellow]")
+    
+    def cache_playlist(self, name):
+        """Download a local playlist for offline play"""
+        tracks = self.playlists.tracks(name)
+        if tracks is None:
+            console.print(f"[red]Playlist '{name}' not found[/red]")
+            return
+        if not tracks:
+            console.print("[yellow]Playlist is empty[/yellow]")
+            return
+        self.download_for_offline(name, tracks)
+    
+    def cache_spotify_playlist(self, index):
+        """Download a Spotify playlist for offline play"""
+        if not hasattr(self, 'spotify_playlists'):
+            console.print("[yellow]Run 'spotify playlists' first[/yellow]")
+            return
+        
+        if index < 1 or index > len(self.spotify_playlists):
+            console.print("[red]Invalid playlist number[/red]")
+            return
+        
+        playlist = self.spotify_playlists[index - 1]
+        tracks = self.read_spotify_playlist(playlist)
+        check_cancelled()
+        if tracks:
+            self.download_for_offline(playlist['name'], tracks)
+    
+    def read_spotify_playlist(self, playlist):
+        """Every track of a Spotify playlist that could be fetched, saying so when pages are missing"""
+        tracks = []
+        try:
+            for page in self.spotify.iter_playlist_tracks(playlist['id']):
+                tracks.extend(page)
+        except PageFetchError as e:
+            console.print(f"[yellow]Loaded {len(tracks)} of {playlist['tracks']} tracks of "
+                          f"{playlist['name']}: {e}[/yellow]")
+        return tracks
+    
+    def _append_playlist_pages(self, pages, load, tracks, playlist):
+        """Append the remaining pages of a playlist to the queue as they arrive"""
+        try:
+            for page in pages:
+                if not page:
+                    continue
+                # The player owns its playlist; it refuses pages once another one was loaded
+                if not self.player.extend_playlist(load, page):
+                    return
+                # The search results list the playlist too, so 'play <n>' reaches new pages
+                tracks.extend(page)
+                self.resolver.resolve_in_background(page)
+                self.prefetch_upcoming()
+        except PageFetchError as e:
+            console.print(f"[yellow]Loaded {len(tracks)} of {playlist['tracks']} tracks of "
+                          f"{playlist['name']}: {e}[/yellow]")
+    
     def show_settings(self):
         """Show current settings"""
         settings = self.config.get('settings', {})
@@ -328,6 +691,20 @@ class MusicPlayerApp:
         console.print(f"[green]default_volume[/green]: {settings.get('default_volume', 50)}")
         console.print(f"[green]auto_play_next[/green]: {settings.get('auto_play_next', True)}")
         console.print(f"[green]results_per_page[/green]: {settings.get('results_per_page', 20)}")
+        console.print(f"[green]cache_size_mb[/green]: {settings.get('cache_size_mb', 1024)}")
+        console.print(f"[green]cache_policy[/green]: {settings.get('cache_policy', 'lru')}")
+        console.print(f"[green]prefetch_count[/green]: {settings.get('prefetch_count', 2)}")
+        console.print(f"[green]streaming[/green]: {settings.get('streaming', False)}")
+        console.print(f"[green]search_cache_ttl[/green]: {settings.get('search_cache_ttl', 86400)}")
+        console.print(f"[green]search_timeout[/green]: {settings.get('search_timeout', 8)}")
+        console.print(f"[green]crossfade_ms[/green]: {settings.get('crossfade_ms', 0)}")
+        console.print(f"[green]stream_buffer_ms[/green]: {settings.get('stream_buffer_ms', 4000)}")
+        console.print(f"[green]startup_budget_ms[/green]: {settings.get('startup_budget_ms', 300)}")
+        console.print(f"[green]tracing[/green]: {settings.get('tracing', False)}")
+        console.print(f"[green]album_art[/green]: {settings.get('album_art', True)}")
+        console.print(f"[green]import_workers[/green]: {settings.get('import_workers', 4)}")
+        console.print(f"[green]import_rate[/green]: {settings.get('import_rate', 5)}")
+        console.print(f"[green]offline[/green]: {settings.get('offline', False)}")
         console.print("\n[dim]Use 'set <setting> <value>' to change[/dim]")
         console.print("[dim]Example: set default_volume 80[/dim]")
     
@@ -380,9 +757,192 @@ class MusicPlayerApp:
                     console.print("[red]Must be between 5-100[/red]")
             except ValueError:
                 console.print("[red]Invalid number[/red]")
+        
+        elif setting == "cache_size_mb":
+            try:
+                size = int(value)
+                if size >= 0:
+                    self.config['settings']['cache_size_mb'] = size
+                    self.audio_cache.set_limits(max_size_mb=size)
+                    save_config(self.config)
+                    console.print(f"[green]✓ Audio cache limit set to {size} MB[/green]")
+                else:
+                    console.print("[red]Cache size must be 0 or more[/red]")
+            except ValueError:
+                console.print("[red]Invalid number[/red]")
+        
+        elif setting == "cache_policy":
+            if value.lower() in ['lru', 'lfu']:
+                self.config['settings']['cache_policy'] = value.lower()
+                self.audio_cache.set_limits(policy=value.lower())
+                save_config(self.config)
+                console.print(f"[green]✓ Cache eviction policy set to {value.lower()}[/green]")
+            else:
+                console.print("[red]Value must be lru/lfu[/red]")
+        
+        elif setting == "prefetch_count":
+            try:
+                num = int(value)
+                if 0 <= num <= 10:
+                    self.config['settings']['prefetch_count'] = num
+                    self.prefetcher.lookahead = num
+                    save_config(self.config)
+                    self.prefetch_upcoming()
+                    console.print(f"[green]✓ Prefetching {num} upcoming tracks[/green]")
+                else:
+                    console.print("[red]Must be between 0-10[/red]")
+            except ValueError:
+                console.print("[red]Invalid number[/red]")
+        
+        elif setting == "streaming":
+            if value.lower() in ['true', 'yes', '1']:
+                self.config['settings']['streaming'] = True
+                self.player.streaming = True
+                save_config(self.config)
+                console.print("[green]✓ Streaming playback enabled[/green]")
+            elif value.lower() in ['false', 'no', '0']:
+                self.config['settings']['streaming'] = False
+                self.player.streaming = False
+                save_config(self.config)
+                console.print("[green]✓ Streaming playback disabled[/green]")
+            else:
+                console.print("[red]Value must be true/false[/red]")
+        
+        elif setting == "stream_buffer_ms":
+            try:
+                ms = int(value)
+                if 500 <= ms <= 30000:
+                    self.config['settings']['stream_buffer_ms'] = ms
+                    self.player.stream_buffer_ms = ms
+                    save_config(self.config)
+                    console.print(f"[green]✓ Stream buffer set to {ms} ms[/green]")
+                else:
+                    console.print("[red]Must be between 500-30000[/red]")
+            except ValueError:
+                console.print("[red]Invalid number[/red]")
+        
+        elif setting == "search_cache_ttl":
+            try:
+                ttl = int(value)
+                if ttl >= 0:
+                    self.config['settings']['search_cache_ttl'] = ttl
+                    self.search_cache.ttl = ttl
+                    save_config(self.config)
+                    console.print(f"[green]✓ Search results cached for {ttl} seconds[/green]")
+                else:
+                    console.print("[red]TTL must be 0 or more[/red]")
+            except ValueError:
+                console.print("[red]Invalid number[/red]")
+        
+        elif setting == "search_timeout":
+            try:
+                timeout = float(value)
+                if 1 <= timeout <= 60:
+                    self.config['settings']['search_timeout'] = timeout
+                    save_config(self.config)
+                    console.print(f"[green]✓ Search timeout set to {timeout}s per source[/green]")
+                else:
+                    console.print("[red]Must be between 1-60[/red]")
+            except ValueError:
+                console.print("[red]Invalid number[/red]")
+        
+        elif setting == "crossfade_ms":
+            try:
+                ms = int(value)
+                if 0 <= ms <= 12000:
+                    self.config['settings']['crossfade_ms'] = ms
+                    self.player.crossfade_ms = ms
+                    save_config(self.config)
+                    if ms:
+                        console.print(f"[green]✓ Crossfade set to {ms} ms[/green]")
+                    else:
+                        console.print("[green]✓ Crossfade disabled (gapless playback)[/green]")
+                else:
+                    console.print("[red]Must be between 0-12000[/red]")
+            except ValueError:
+                console.print("[red]Invalid number[/red]")
+        
+        elif setting == "startup_budget_ms":
+            try:
+                ms = int(value)
+                if ms > 0:
+                    self.config['settings']['startup_budget_ms'] = ms
+                    save_config(self.config)
+                    console.print(f"[green]✓ Startup budget set to {ms} ms[/green]")
+                else:
+                    console.print("[red]Budget must be more than 0[/red]")
+            except ValueError:
+                console.print("[red]Invalid number[/red]")
+        
+        elif setting == "tracing":
+            if value.lower() in ['true', 'yes', '1']:
+                self.config['settings']['tracing'] = True
+                tracer.enable()
+                save_config(self.config)
+                console.print("[green]✓ Tracing enabled[/green]")
+            elif value.lower() in ['false', 'no', '0']:
+                self.config['settings']['tracing'] = False
+                tracer.disable()
+                save_config(self.config)
+                console.print("[green]✓ Tracing disabled[/green]")
+            else:
+                console.print("[red]Value must be true/false[/red]")
+        
+        elif setting == "album_art":
+            if value.lower() in ['true', 'yes', '1']:
+                self.config['settings']['album_art'] = True
+                save_config(self.config)
+                console.print("[green]✓ Album art enabled[/green]")
+            elif value.lower() in ['false', 'no', '0']:
+                self.config['settings']['album_art'] = False
+                save_config(self.config)
+                console.print("[green]✓ Album art disabled[/green]")
+            else:
+                console.print("[red]Value must be true/false[/red]")
+        
+        elif setting == "offline":
+            if value.lower() in ['true', 'yes', '1']:
+                self.config['settings']['offline'] = True
+                self.player.offline = self.resolver.offline = self.artwork.offline = True
+                save_config(self.config)
+                console.print("[green]✓ Offline mode enabled: only downloaded tracks play[/green]")
+            elif value.lower() in ['false', 'no', '0']:
+                self.config['settings']['offline'] = False
+                self.player.offline = self.resolver.offline = self.artwork.offline = False
+                save_config(self.config)
+                console.print("[green]✓ Offline mode disabled[/green]")
+            else:
+                console.print("[red]Value must be true/false[/red]")
+        
+        elif setting == "import_workers":
+            try:
+                num = int(value)
+                if 1 <= num <= 16:
+                    self.config['settings']['import_workers'] = num
+                    save_config(self.config)
+                    console.print(f"[green]✓ Imports resolve {num} tracks at a time[/green]")
+                else:
+                    console.print("[red]Must be between 1-16[/red]")
+            except ValueError:
+                console.print("[red]Invalid number[/red]")
+        
+        elif setting == "import_rate":
+            try:
+                rate = float(value)
+                if 0 <= rate <= 50:
+                    self.config['settings']['import_rate'] = rate
+                    save_config(self.config)
+                    if rate:
+                        console.print(f"[green]✓ Imports search at most {rate:g} times per second[/green]")
+                    else:
+                        console.print("[green]✓ Import searches are no longer rate limited[/green]")
+                else:
+                    console.print("[red]Must be between 0-50[/red]")
+            except ValueError:
+                console.print("[red]Invalid number[/red]")
         else:
             console.print(f"[red]Unknown setting: {setting}[/red]")
-            console.print("[dim]Available: default_volume, auto_play_next, results_per_page[/dim]")
+            console.print("[dim]Available: default_volume, auto_play_next, results_per_page, cache_size_mb, cache_policy, prefetch_count, streaming, stream_buffer_ms, search_cache_ttl, search_timeout, crossfade_ms, startup_budget_ms, tracing, album_art, import_workers, import_rate, offline[/dim]")
     
     def configure(self):
         """Configure API keys"""
@@ -422,19 +982,33 @@ class MusicPlayerApp:
         args = parts[1] if len(parts) > 1 else ""
         
         if cmd == "search":
-            if args:
-                self.search_music(args)
+            # --fresh bypasses the search cache, --local skips the network entirely
+            use_cache = True
+            local = False
+            if args.startswith("--fresh"):
+                use_cache = False
+                args = args[len("--fresh"):].strip()
+            elif args.startswith("--local"):
+                local = True
+                args = args[len("--local"):].strip()
+            if not args:
+                console.print("[yellow]Usage: search [--fresh|--local] <query>[/yellow]")
+            elif local or self.config.get('settings', {}).get('offline', False):
+                self.search_local(args)
             else:
-                console.print("[yellow]Usage: search <query>[/yellow]")
+                self.run_job(f"search {args}", self.search_music, args, use_cache, lane='search')
         
         elif cmd == "play":
             try:
                 index = int(args)
-                self.play_track(index)
+                self.run_job(f"play #{index}", self.play_track, index, lane='playback')
             except ValueError:
                 console.print("[yellow]Usage: play <number>[/yellow]")
         
         elif cmd == "pause":
+            # A track still loading would otherwise start playing after the pause
+            if self._jobs:
+                self._jobs.cancel_lane('playback')
             self.player.pause()
             console.print("[yellow]⏸️  Paused[/yellow]")
         
@@ -443,21 +1017,42 @@ class MusicPlayerApp:
             console.print("[green]▶️  Resumed[/green]")
         
         elif cmd == "stop":
+            if self._jobs:
+                self._jobs.cancel_lane('playback')
             self.player.stop()
+            self.prefetcher.reset()
             console.print("[red]⏹️  Stopped[/red]")
             console.print("[dim]Playlist cleared[/dim]")
         
+        elif cmd == "seek":
+            # seek 1:30, seek 90, or seek +10 / seek -10 relative to now
+            offset = parse_duration(args.lstrip('+-'))
+            if not args or (not offset and args.lstrip('+-') not in ('0', '0:00')):
+                console.print("[yellow]Usage: seek <m:ss|seconds|+seconds|-seconds>[/yellow]")
+            elif not self.player.current_track:
+                console.print("[yellow]No track playing[/yellow]")
+            else:
+                if args.startswith('+'):
+                    offset = self.player.get_time() + offset
+                elif args.startswith('-'):
+                    offset = self.player.get_time() - offset
+                if self.player.seek(offset):
+                    console.print(f"[cyan]⏩ {format_duration(self.player.get_time())}[/cyan]")
+        
         elif cmd == "next":
             track = self.player.play_next()
             if track:
-                self.play_track_from_info(track)
+                self.play_in_background(track)
             else:
                 console.print("[yellow]No next track[/yellow]")
         
         elif cmd == "prev":
             track = self.player.play_previous()
+            # Offline, step back over tracks that aren't downloaded (playing one would skip forward)
+            while track and self.player.offline and not self.available_offline(track):
+                track = self.player.play_previous()
             if track:
-                self.play_track_from_info(track)
+                self.play_in_background(track)
             else:
                 console.print("[yellow]No previous track[/yellow]")
         
@@ -487,7 +1082,7 @@ class MusicPlayerApp:
         elif cmd == "playlist":
             sub_parts = args.split(maxsplit=1)
             if not sub_parts:
-                console.print("[yellow]Usage: playlist <create|add|show|load> [name][/yellow]")
+                console.print("[yellow]Usage: playlist <create|add|show|load|cache> [name][/yellow]")
                 return
             
             sub_cmd = sub_parts[0].lower()
@@ -500,35 +1095,55 @@ class MusicPlayerApp:
             elif sub_cmd == "show":
                 self.show_playlists()
             elif sub_cmd == "load" and sub_args:
-                self.load_playlist(sub_args)
+                self.run_job(f"playlist load {sub_args}", self.load_playlist, sub_args, lane='playback')
+            elif sub_cmd == "cache" and sub_args:
+                self.run_job(f"playlist cache {sub_args}", self.cache_playlist, sub_args, bulk=True)
             else:
-                console.print("[yellow]Usage: playlist <create|add|show|load> [name][/yellow]")
+                console.print("[yellow]Usage: playlist <create|add|show|load|cache> [name][/yellow]")
         
         elif cmd == "spotify":
             sub_parts = args.split(maxsplit=1)
             if not sub_parts:
-                console.print("[yellow]Usage: spotify <playlists|show|load> [number][/yellow]")
+                console.print("[yellow]Usage: spotify <playlists|show|load|import|cache> [number][/yellow]")
+                return
+            
+            if self.config.get('settings', {}).get('offline', False):
+                console.print("[yellow]Spotify needs the network; use 'set offline false' first[/yellow]")
                 return
             
             sub_cmd = sub_parts[0].lower()
             sub_args = sub_parts[1] if len(sub_parts) > 1 else ""
             
             if sub_cmd == "playlists":
-                self.show_spotify_playlists()
+                self.run_job("spotify playlists", self.show_spotify_playlists)
             elif sub_cmd == "show" and sub_args:
                 try:
                     index = int(sub_args)
-                    self.show_spotify_playlist_tracks(index)
+                    self.run_job(f"spotify show {index}", self.show_spotify_playlist_tracks, index, lane='playlist')
                 except ValueError:
                     console.print("[yellow]Usage: spotify show <number>[/yellow]")
             elif sub_cmd == "load" and sub_args:
                 try:
                     index = int(sub_args)
-                    self.load_spotify_playlist(index)
+                    self.run_job(f"spotify load {index}", self.load_spotify_playlist, index, lane='playback')
                 except ValueError:
                     console.print("[yellow]Usage: spotify load <number>[/yellow]")
+            elif sub_cmd == "import" and sub_args:
+                import_parts = sub_args.split(maxsplit=1)
+                try:
+                    index = int(import_parts[0])
+                    name = import_parts[1] if len(import_parts) > 1 else None
+                    self.run_job(f"spotify import {index}", self.import_spotify_playlist, index, name, bulk=True)
+                except ValueError:
+                    console.print("[yellow]Usage: spotify import <number> \\[name][/yellow]")
+            elif sub_cmd == "cache" and sub_args:
+                try:
+                    index = int(sub_args)
+                    self.run_job(f"spotify cache {index}", self.cache_spotify_playlist, index, bulk=True)
+                except ValueError:
+                    console.print("[yellow]Usage: spotify cache <number>[/yellow]")
             else:
-                console.print("[yellow]Usage: spotify <playlists|show|load> [number][/yellow]")
+                console.print("[yellow]Usage: spotify <playlists|show|load|import|cache> [number][/yellow]")
         
         elif cmd == "page":
             try:
@@ -558,16 +1173,47 @@ class MusicPlayerApp:
                 # Play first track after shuffle
                 track = self.player.play_next()
                 if track:
-                    self.play_track_from_info(track)
+                    self.play_in_background(track)
             else:
                 console.print("[yellow]No playlist loaded[/yellow]")
         
         elif cmd == "now":
             if self.player.current_track:
-                display_now_playing(self.player.current_track, self.player)
+                display_now_playing(self.player.current_track, self.player, self.shown_artwork())
             else:
                 console.print("[yellow]No track playing[/yellow]")
         
+        elif cmd == "stats":
+            if args.strip().lower() == "reset":
+                tracer.reset()
+                console.print("[green]✓ Timing stats cleared[/green]")
+            else:
+                rows, counters = tracer.stats()
+                display_stats(rows, counters)
+                if not tracer.enabled:
+                    console.print("[dim]Tracing is off; turn it on with 'set tracing true' or start with --trace[/dim]")
+        
+        elif cmd == "jobs":
+            sub_parts = args.split()
+            if not sub_parts:
+                display_jobs(self._jobs.active() if self._jobs else [])
+            elif sub_parts[0].lower() == "cancel" and len(sub_parts) == 2:
+                if sub_parts[1].lower() == "all":
+                    if self._jobs:
+                        self._jobs.cancel_all()
+                    console.print("[green]✓ Cancelled all jobs[/green]")
+                else:
+                    try:
+                        job_id = int(sub_parts[1])
+                        if self._jobs and self._jobs.cancel(job_id):
+                            console.print(f"[green]✓ Cancelled job {job_id}[/green]")
+                        else:
+                            console.print(f"[red]No job {job_id}[/red]")
+                    except ValueError:
+                        console.print("[yellow]Usage: jobs cancel <id|all>[/yellow]")
+            else:
+                console.print("[yellow]Usage: jobs [cancel <id|all>][/yellow]")
+        
         elif cmd == "help":
             display_menu()
         
@@ -587,7 +1233,7 @@ class MusicPlayerApp:
         
         while self.running:
             try:
-                command = get_input("♪ >")
+                command = self.prompt.input("♪ >")
                 if command:
                     self.handle_command(command)
             except KeyboardInterrupt:
@@ -595,9 +1241,88 @@ class MusicPlayerApp:
             except Exception as e:
                 console.print(f"[red]Error: {e}[/red]")
         
-        self.player.stop()
+        if self._jobs:
+            self._jobs.shutdown()
+        self.prefetcher.shutdown()
+        self.resolver.shutdown()
+        self.artwork.shutdown()
+        if self._player:
+            self._player.close()
+        self.audio_cache.flush()
+        self.playlists.close()
+        self.library.close()
+        self.search_cache.close()
+        tracer.close()
+
+def measure_imports():
+    """Import main in a fresh interpreter and return (total, per-module) import times in ms"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import main'],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True
+    )
+    # Children are listed before the module that imported them, two spaces deeper
+    total = 0.0
+    modules = []
+    children = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        try:
+            ms = int(cumulative) / 1000
+        except ValueError:
+            continue  # header line
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            children.append((name.strip(), ms))
+        elif depth == 0:
+            if name.strip() == 'main':
+                total, modules = ms, children
+            children = []
+    return total, modules
+
+def profile_startup():
+    """Print a breakdown of time-to-prompt and exit non-zero if it is over budget"""
+    from rich.table import Table
+    
+    import_ms, modules = measure_imports()
+    app = MusicPlayerApp()
+    init_ms = sum(ms for _, ms in app.startup_phases)
+    budget = app.config.get('settings', {}).get('startup_budget_ms', 300)
+    
+    table = Table(show_header=True, header_style="bold magenta", title="Startup profile")
+    table.add_column("Step", style="cyan")
+    table.add_column("ms", justify="right")
+    for name, ms in sorted(modules, key=lambda item: -item[1]):
+        table.add_row(f"import {name}", f"{ms:.1f}")
+    table.add_row("[bold]imports[/bold]", f"[bold]{import_ms:.1f}[/bold]")
+    for name, ms in app.startup_phases:
+        table.add_row(f"init {name}", f"{ms:.1f}")
+    table.add_row("[bold]init[/bold]", f"[bold]{init_ms:.1f}[/bold]")
+    console.print(table)
+    
+    loaded = [name for name in DEFERRED_MODULES if name in sys.modules]
+    if loaded:
+        console.print(f"[yellow]Loaded before the prompt: {', '.join(loaded)}[/yellow]")
+    
+    total = import_ms + init_ms
+    if total <= budget:
+        console.print(f"[green]✓ Time to prompt: {total:.0f} ms (budget {budget} ms)[/green]")
+        return 0
+    console.print(f"[red]Time to prompt: {total:.0f} ms is over the {budget} ms budget[/red]")
+    return 1
 
 def main():
+    if '--profile-startup' in sys.argv[1:]:
+        sys.exit(profile_startup())
+    if '--trace' in sys.argv[1:]:
+        # --trace FILE appends every span and counter to FILE as JSON lines
+        index = sys.argv.index('--trace')
+        if index + 1 >= len(sys.argv):
+            print("Usage: main.py --trace <file.jsonl>")
+            sys.exit(2)
+        tracer.enable(export_path=sys.argv[index + 1])
     app = MusicPlayerApp()
     app.run()
 
@@ -1,13 +1,61 @@
-import yt_dlp
-from ytmusicapi import YTMusic
-import spotipy
-from spotipy.oauth2 import SpotifyOAuth
+import time
+from concurrent.futures import ThreadPoolExecutor
 from config import load_config, CACHE_DIR
+from track import Track, parse_duration
+from cache import StreamInfoCache
+from extractor import YoutubeDLPool
+from tracing import tracer
+
+# Spotify API page sizes (the maximum each endpoint allows)
+PLAYLIST_PAGE_SIZE = 100
+PLAYLISTS_PAGE_SIZE = 50
+
+# Only request the playlist item fields we actually use
+PLAYLIST_TRACK_FIELDS = ('total,items(is_local,track(id,name,duration_ms,external_ids(isrc),'
+                         'artists(name),album(name,images(url))))')
+
+# Attempts per Spotify page, with a growing pause between them
+PAGE_ATTEMPTS = 3
+PAGE_RETRY_DELAY = 0.5
+
+
+class PageFetchError(Exception):
+    """Raised when a page of a Spotify listing still fails after PAGE_ATTEMPTS tries"""
+
+
+class PlaylistPage(list):
+    """The tracks of one playlist page; `dropped` counts its items that aren't playable tracks"""
+    
+    def __init__(self, tracks, dropped=0):
+        super().__init__(tracks)
+        self.dropped = dropped
+
 
 class MusicSource:
     """Base class for music sources"""
     
-    def search(self, query, limit=10):
+    name = None
+    
+    def __init__(self, search_cache=None):
+        self.search_cache = search_cache
+    
+    def search(self, query, limit=10, use_cache=True, remember=True):
+        """Search the source, answering repeated queries from the search cache (remember=False doesn't add to it)"""
+        if use_cache and self.search_cache:
+            cached = self.search_cache.get(self.name, query, limit)
+            if cached is not None:
+                tracer.count('search_cache.hit')
+                return [Track.from_dict(track) for track in cached]
+            tracer.count('search_cache.miss')
+        
+        with tracer.span(f'search.{self.name}'):
+            results = self._search(query, limit)
+        # Empty results may come from a transient error, so don't cache them
+        if results and remember and self.search_cache:
+            self.search_cache.put(self.name, query, limit, [track.to_dict() for track in results])
+        return results
+    
+    def _search(self, query, limit):
         raise NotImplementedError
     
     def get_stream_url(self, track_id):
@@ -17,8 +65,11 @@ class MusicSource:
 class YouTubeMusicSource(MusicSource):
     """YouTube Music integration"""
     
-    def __init__(self):
-        self.ytmusic = YTMusic()
+    name = 'youtube'
+    
+    def __init__(self, search_cache=None):
+        super().__init__(search_cache)
+        self._ytmusic = None
         self.ydl_opts = {
             'format': 'bestaudio/best',
             'quiet': True,
@@ -29,33 +80,53 @@ class YouTubeMusicSource(MusicSource):
             'logtostderr': False,
             'no_color': True,
         }
+        # Extractor instances are reused so yt-dlp only initializes once,
+        # and extracted info is reused until its signed URLs expire
+        self.extractors = YoutubeDLPool(self.ydl_opts, size=2)
+        self.stream_info = StreamInfoCache()
     
-    def search(self, query, limit=10):
+    @property
+    def ytmusic(self):
+        """YouTube Music client, created on first use"""
+        if self._ytmusic is None:
+            from ytmusicapi import YTMusic
+            self._ytmusic = YTMusic()
+        return self._ytmusic
+    
+    def _search(self, query, limit):
         """Search YouTube Music"""
         try:
             results = self.ytmusic.search(query, filter="songs", limit=limit)
             tracks = []
             for item in results:
-                tracks.append({
-                    'id': item.get('videoId'),
-                    'title': item.get('title', 'Unknown'),
-                    'artist': ', '.join([a['name'] for a in item.get('artists', [])]),
-                    'album': item.get('album', {}).get('name', 'Unknown'),
-                    'duration': item.get('duration', 'Unknown'),
-                    'thumbnail': item.get('thumbnails', [{}])[-1].get('url', ''),
-                    'source': 'youtube'
-                })
+                duration_s = item.get('duration_seconds')
+                tracks.append(Track(
+                    id=item.get('videoId'),
+                    title=item.get('title', 'Unknown'),
+                    artist=', '.join([a['name'] for a in item.get('artists', [])]),
+                    album=(item.get('album') or {}).get('name', 'Unknown'),
+                    duration_ms=duration_s * 1000 if duration_s else parse_duration(item.get('duration')),
+                    thumbnail=(item.get('thumbnails') or [{}])[-1].get('url', ''),
+                    source='youtube'
+                ))
             return tracks
         except Exception as e:
             print(f"YouTube search error: {e}")
             return []
     
+    def get_info(self, track_id):
+        """Get extracted video info, reusing it until its stream URLs expire"""
+        info = self.stream_info.get(track_id)
+        if info is None:
+            with self.extractors.acquire() as ydl:
+                info = ydl.extract_info(f"https://music.youtube.com/watch?v={track_id}", download=False)
+            self.stream_info.put(track_id, info)
+        return info
+    
     def get_stream_url(self, track_id):
         """Get streaming URL for a track"""
         try:
-            with yt_dlp.YoutubeDL(self.ydl_opts) as ydl:
-                info = ydl.extract_info(f"https://music.youtube.com/watch?v={track_id}", download=False)
-                return info['url']
+            return self.get_info(track_id)['url']
         except Exception as e:
             print(f"Error getting stream URL: {e}")
             return None
@@ -64,24 +135,45 @@ class YouTubeMusicSource(MusicSource):
 class SpotifySource(MusicSource):
     """Spotify integration"""
     
-    def __init__(self):
-        config = load_config()
-        self.sp = None
-        if config['spotify']['client_id'] and config['spotify']['client_secret']:
+    name = 'spotify'
+    
+    def __init__(self, search_cache=None):
+        super().__init__(search_cache)
+        self.config = load_config()['spotify']
+        self.token_cache = CACHE_DIR / ".spotify_cache"
+        self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="spotify")
+        self._sp = None
+    
+    @property
+    def configured(self):
+        """Whether Spotify credentials have been set"""
+        return bool(self.config['client_id'] and self.config['client_secret'])
+    
+    @property
+    def sp(self):
+        """Spotify client, authenticating (possibly in the browser) on first use"""
+        if self._sp is None and self.configured:
             try:
-                self.sp = spotipy.Spotify(auth_manager=SpotifyOAuth(
-                    client_id=config['spotify']['client_id'],
-                    client_secret=config['spotify']['client_secret'],
-                    redirect_uri=config['spotify']['redirect_uri'],
+                import spotipy
+                from spotipy.oauth2 import SpotifyOAuth
+                self._sp = spotipy.Spotify(auth_manager=SpotifyOAuth(
+                    client_id=self.config['client_id'],
+                    client_secret=self.config['client_secret'],
+                    redirect_uri=self.config['redirect_uri'],
                     scope="user-library-read playlist-read-private user-read-playback-state",
-                    cache_path=str(CACHE_DIR / ".spotify_cache"),
+                    cache_path=str(self.token_cache),
                     open_browser=True
                 ))
             except Exception as e:
                 print(f"Spotify auth error: {e}")
-                self.sp = None
+                self._sp = None
+        return self._sp
+    
+    def has_session(self):
+        """Whether the client can be used without an interactive login"""
+        return self._sp is not None or (self.configured and self.token_cache.exists())
     
-    def search(self, query, limit=10):
+    def _search(self, query, limit):
         """Search Spotify"""
         if not self.sp:
             return []
@@ -90,61 +182,92 @@ class SpotifySource(MusicSource):
             results = self.sp.search(q=query, limit=limit, type='track')
             tracks = []
             for item in results['tracks']['items']:
-                tracks.append({
-                    'id': item['id'],
-                    'title': item['name'],
-                    'artist': ', '.join([a['name'] for a in item['artists']]),
-                    'album': item['album']['name'],
-                    'duration': f"{item['duration_ms'] // 60000}:{(item['duration_ms'] // 1000) % 60:02d}",
-                    'thumbnail': item['album']['images'][0]['url'] if item['album']['images'] else '',
-                    'source': 'spotify',
-                    'preview_url': item.get('preview_url', '')
-                })
+                tracks.append(Track(
+                    id=item['id'],
+                    title=item['name'],
+                    artist=', '.join([a['name'] for a in item['artists']]),
+                    album=item['album']['name'],
+                    duration_ms=item['duration_ms'],
+                    thumbnail=item['album']['images'][0]['url'] if item['album']['images'] else '',
+                    source='spotify',
+                    isrc=item.get('external_ids', {}).get('isrc')
+                ))
             return tracks
         except Exception as e:
             print(f"Spotify search error: {e}")
             return []
     
+    def _fetch_page(self, fetch_page, offset):
+        """Fetch one page, retrying failures; raises PageFetchError if every attempt fails"""
+        for attempt in range(1, PAGE_ATTEMPTS + 1):
+            try:
+                return fetch_page(offset)
+            except Exception as e:
+                if attempt == PAGE_ATTEMPTS:
+                    raise PageFetchError(f"page at offset {offset} failed: {e}") from e
+                time.sleep(PAGE_RETRY_DELAY * attempt)
+    
+    def _iter_pages(self, fetch_page, page_size):
+        """Yield the items of every page in order, fetching later pages concurrently"""
+        first = self._fetch_page(fetch_page, 0)
+        yield first['items']
+        
+        # The first page tells us the total, so the rest can be requested at once
+        offsets = range(page_size, first['total'], page_size)
+        futures = [self.executor.submit(self._fetch_page, fetch_page, offset) for offset in offsets]
+        for future in futures:
+            yield future.result()['items']
+    
     def get_user_playlists(self):
         """Get user's Spotify playlists"""
         if not self.sp:
             return []
         
         try:
-            playlists = self.sp.current_user_playlists()
+            fetch_page = lambda offset: self.sp.current_user_playlists(limit=PLAYLISTS_PAGE_SIZE, offset=offset)
             return [{
                 'id': p['id'],
                 'name': p['name'],
                 'tracks': p['tracks']['total']
-            } for p in playlists['items']]
+            } for page in self._iter_pages(fetch_page, PLAYLISTS_PAGE_SIZE) for p in page if p]
         except Exception as e:
             print(f"Error getting playlists: {e}")
             return []
     
-    def get_playlist_tracks(self, playlist_id):
-        """Get tracks from a Spotify playlist"""
+    def _parse_playlist_item(self, item):
+        """Convert a playlist item into a Track (None for local files and removed tracks)"""
+        track = item.get('track')
+        if not track or item.get('is_local') or not track.get('id'):
+            return None
+        
+        album = track.get('album') or {}
+        return Track(
+            id=track['id'],
+            title=track['name'],
+            artist=', '.join([a['name'] for a in track['artists']]),
+            album=album.get('name', 'Unknown'),
+            duration_ms=track.get('duration_ms', 0),
+            thumbnail=album['images'][0]['url'] if album.get('images') else '',
+            source='spotify',
+            isrc=(track.get('external_ids') or {}).get('isrc')
+        )
+    
+    def iter_playlist_tracks(self, playlist_id):
+        """Yield the tracks of a Spotify playlist page by page, in playlist order, as PlaylistPages"""
         if not self.sp:
-            return []
+            return
         
-        try:
-            results = self.sp.playlist_tracks(playlist_id)
-            tracks = []
-            for item in results['items']:
-                track = item['track']
-                if track:
-                    duration_ms = track.get('duration_ms', 0)
-                    duration_str = f"{duration_ms // 60000}:{(duration_ms // 1000) % 60:02d}" if duration_ms else "0:00"
-                    
-                    tracks.append({
-                        'id': track['id'],
-                        'title': track['name'],
-                        'artist': ', '.join([a['name'] for a in track['artists']]),
-                        'album': track['album']['name'],
-                        'duration': duration_str,
-                        'thumbnail': track['album']['images'][0]['url'] if track['album'].get('images') else '',
-                        'source': 'spotify'
-                    })
-            return tracks
-        except Exception as e:
-            print(f"Error getting playlist tracks: {e}")
-            return []
+        fetch_page = lambda offset: self.sp.playlist_items(
+            playlist_id, fields=PLAYLIST_TRACK_FIELDS, limit=PLAYLIST_PAGE_SIZE,
+            offset=offset, additional_types=('track',)
+        )
+        # A page that still fails raises PageFetchError, so the caller learns the
+        # playlist is incomplete instead of getting a shorter one
+        for page in self._iter_pages(fetch_page, PLAYLIST_PAGE_SIZE):
+            tracks = [t for t in map(self._parse_playlist_item, page) if t]
+            # Pages with nothing playable still arrive, so every dropped item is counted
+            yield PlaylistPage(tracks, len(page) - len(tracks))
+    
+    def get_playlist_tracks(self, playlist_id):
+        """Get all tracks from a Spotify playlist (raises PageFetchError if a page can't be fetched)"""
+        return [track for page in self.iter_playlist_tracks(playlist_id) for track in page]
@@ -0,0 +1,141 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from cache import NotCached
+from jobs import JobCancelled, current_job
+from player import AUDIO_FORMAT
+
+# Seconds between progress reports
+PROGRESS_INTERVAL = 5
+
+
+class DownloadProgress:
+    """Counts for one playlist download, shared by its workers"""
+
+    def __init__(self, total, budget_bytes):
+        self.total = total
+        self.budget_bytes = budget_bytes
+        self.lock = threading.Lock()
+        self.downloaded = 0
+        self.cached = 0
+        self.unmatched = 0
+        self.failed = 0
+        self.bytes = 0
+        self.downloaded_bytes = 0
+        self.in_flight = 0
+        self.full = False
+        self.started = time.perf_counter()
+
+    @property
+    def finished(self):
+        """Tracks dealt with so far, whatever the outcome"""
+        return self.downloaded + self.cached + self.unmatched + self.failed
+
+    @property
+    def available(self):
+        """Tracks that will play offline"""
+        return self.downloaded + self.cached
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rate_mb(self):
+        """Megabytes downloaded per second"""
+        return self.downloaded_bytes / (1024 * 1024) / self.elapsed if self.elapsed else 0.0
+
+    def estimate(self):
+        """Expected size of a track not downloaded yet: the average so far (0 before the first)"""
+        return self.bytes // self.available if self.available else 0
+
+
+class PlaylistDownloader:
+    """Downloads whole playlists into the audio cache on a bounded pool, within the cache's disk budget"""
+
+    def __init__(self, player, resolve, workers=2):
+        self.player = player
+        self.cache = player.cache
+        self.resolve = resolve
+        self.workers = workers
+
+    def run(self, tracks, on_progress=None):
+        """Make every track of a playlist playable offline, stopping once the disk budget is used up"""
+        # A track listed twice is downloaded (and counted against the budget) once
+        tracks = list({track.id: track for track in tracks}.values())
+        job = current_job()
+        cancelled = lambda: job is not None and job.cancelled
+        # Set once the budget is used up: nothing new starts, but downloads under way finish
+        full = threading.Event()
+        progress = DownloadProgress(len(tracks), self.cache.max_bytes)
+        protected = []
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="offline") as executor:
+                # Once cancelled, queued tracks return at once and running downloads are aborted
+                pending = {executor.submit(self._download, track, progress, full, cancelled, protected)
+                           for track in tracks}
+                while pending:
+                    _, pending = wait(pending, timeout=PROGRESS_INTERVAL)
+                    if pending and on_progress and not cancelled():
+                        on_progress(progress)
+        finally:
+            # The playlist stays cached, but follows the normal eviction policy again
+            self.cache.release(protected, AUDIO_FORMAT)
+        if cancelled():
+            raise JobCancelled()
+        return progress
+
+    def _download(self, track, progress, full, cancelled, protected):
+        """Resolve and cache one track, unless the budget ran out or the run was cancelled"""
+        if full.is_set() or cancelled():
+            return
+        try:
+            # Spotify tracks are matched on YouTube first, as for playback
+            playable = self.resolve(track)
+        except Exception as e:
+            print(f"Download error: {e}")
+            playable = None
+        if not playable:
+            with progress.lock:
+                progress.unmatched += 1
+            return
+
+        video_id = playable.id
+        size = self.cache.entry_size(video_id, AUDIO_FORMAT)
+        with progress.lock:
+            # Everything this playlist needs has to fit at once, or caching its last
+            # tracks would evict its first ones
+            needed = size if size is not None else progress.estimate()
+            reserved = progress.in_flight * progress.estimate()
+            if progress.bytes + reserved + needed > progress.budget_bytes:
+                progress.full = True
+                full.set()
+                return
+            progress.in_flight += 1
+        # Protected before it lands, so a neighbour's download can't evict it
+        self.cache.protect(video_id, AUDIO_FORMAT)
+        protected.append(video_id)
+
+        try:
+            self.player.fetch(video_id, cancelled=cancelled)
+        except (JobCancelled, NotCached):
+            with progress.lock:
+                progress.in_flight -= 1
+            return
+        except Exception as e:
+            print(f"Download error ({track.title}): {e}")
+            with progress.lock:
+                progress.in_flight -= 1
+                progress.failed += 1
+            return
+
+        new_size = self.cache.entry_size(video_id, AUDIO_FORMAT) or 0
+        with progress.lock:
+            progress.in_flight -= 1
+            progress.bytes += new_size
+            if size is None:
+                progress.downloaded += 1
+                progress.downloaded_bytes += new_size
+            else:
+                progress.cached += 1
@@ -1,144 +1,750 @@
+import os
+
+# Suppress pygame welcome message (must be set before pygame is imported)
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "1"
+# pygame's event queue needs a video driver; we never open a window
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
 import pygame
 import time
+import queue
+import signal
+import functools
+import itertools
 import threading
-import os
-import tempfile
-import yt_dlp
 from pathlib import Path
+from typing import NamedTuple, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+from cache import AudioCache, NotCached
+from extractor import YoutubeDLPool
+from streaming import StreamingPlayback
+from tracing import tracer
+from jobs import JobCancelled, current_job
+
+# Posted by the mixer whenever the music stream stops
+TRACK_END_EVENT = pygame.USEREVENT + 1
+# Posted by us right after every stop of the music stream (see _halt_music)
+MUSIC_HALTED_EVENT = pygame.USEREVENT + 2
+
+# Codec that downloads are cached as. YouTube's native bestaudio is usually
+# opus, which only needs remuxing from WebM into an Ogg container that pygame
+# can decode; other codecs (e.g. AAC in m4a) are transcoded as a fallback.
+AUDIO_FORMAT = 'opus'
+
+# yt-dlp format selectors per target codec, preferring streams that need no re-encode
+FORMAT_SELECTORS = {
+    'opus': 'bestaudio[acodec=opus]/bestaudio/best',
+    'mp3': 'bestaudio/best',
+}
+
+# Concurrent yt-dlp downloads (one pooled YoutubeDL each). Aborted downloads
+# give up their slot at once but may need a moment to stop (yt-dlp can't be
+# interrupted while extracting), so there are spare threads for them.
+DOWNLOAD_WORKERS = 3
+DOWNLOAD_THREADS = DOWNLOAD_WORKERS * 2
+
+# How often a caller waiting on a download checks whether it was cancelled (seconds)
+CANCEL_POLL_INTERVAL = 0.05
+
+
+def _kill_children_using(path_prefix):
+    """Terminate our child processes (FFmpeg started by yt-dlp) working on path_prefix.*"""
+    # Needs /proc; elsewhere cancelled downloads just never start FFmpeg
+    proc = Path('/proc')
+    if not proc.is_dir():
+        return 0
+    killed = 0
+    for entry in proc.iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            # The parent pid is the second field after the parenthesised command name
+            ppid = int((entry / 'stat').read_text().rsplit(')', 1)[1].split()[1])
+            if ppid != os.getpid():
+                continue
+            cmdline = (entry / 'cmdline').read_bytes().replace(b'\0', b' ').decode(errors='ignore')
+            if path_prefix + '.' in cmdline:
+                os.kill(int(entry.name), signal.SIGTERM)
+                killed += 1
+        except (OSError, ValueError, IndexError):
+            continue
+    return killed
+
+
+class _Flight:
+    """One download shared by every caller waiting for the same file"""
+    
+    def __init__(self, previous=None):
+        self.previous = previous
+        self.done = threading.Event()
+        self.abort = threading.Event()
+        self.waiters = 0
+        self.holds_slot = False
+        self.result = None
+        self.error = None
+
+
+class PlayerState(NamedTuple):
+    """Snapshot of the player, published after every command"""
+    track: Optional[object]
+    index: int
+    playlist: tuple
+    playing: bool
+    paused: bool
+    volume: int
+    length_ms: int
+
+
+def _command(method):
+    """Run a MusicPlayer method on the player's own thread and wait for its result"""
+    @functools.wraps(method)
+    def send(self, *args, **kwargs):
+        return self._send(method, self, *args, **kwargs)
+    return send
 
-# Suppress pygame welcome message
-os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "1"
 
 class MusicPlayer:
     """Pygame-based music player with streaming support"""
     
-    def __init__(self):
+    def __init__(self, cache=None, stream_resolver=None, info_cache=None):
         pygame.mixer.init(frequency=44100, size=-16, channels=2, buffer=4096)
         self.current_track = None
-        self.playlist = []
+        # A tuple that commands replace rather than change, so published snapshots
+        # can share it and never see it move
+        self.playlist = ()
+        # Bumped by every load (and stop), so pages of a playlist that has since
+        # been replaced are not appended to the new one
+        self._playlist_loads = itertools.count(1)
+        self.playlist_load = 0
         self.current_index = -1
+        # Playlist index the current track was started at (-1 if none); once the
+        # playlist moves on without it, its end no longer drives auto-play
+        self.track_index = -1
         self.is_playing = False
         self.is_paused = False
         self.volume = 0.5
         pygame.mixer.music.set_volume(self.volume)
         self.current_file = None
-        self.start_time = 0
-        self.paused_time = 0
+        # Real length of the current track, from the cached file's metadata
+        self.length_ms = 0
+        self.cache = cache or AudioCache()
+        # Downloads in flight, one per (video, codec), shared by everyone waiting for it
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+        self._download_pools = {}
+        self._download_executor = ThreadPoolExecutor(max_workers=DOWNLOAD_THREADS, thread_name_prefix="download")
+        self._download_slots = threading.Semaphore(DOWNLOAD_WORKERS)
+        # Bumped by every play(), so a track still downloading knows it was replaced
+        self._play_generations = itertools.count(1)
+        self._play_generation = 0
+        # When each in-flight download started, for the extract/download/ffmpeg spans
+        self._fetch_started = {}
+        self._postprocess_started = {}
+        self.info_cache = info_cache
+        # Streaming mode: play uncached tracks straight from their stream URL
+        self.stream_resolver = stream_resolver
+        self.streaming = False
+        self.stream_buffer_ms = 4000
+        self.stream = None
+        # Offline mode: only cached tracks play, and nothing is downloaded
+        self.offline = False
+        # End-of-track detection: the mixer posts TRACK_END_EVENT whenever the
+        # music stops, including when we stop it ourselves. Each of our stops is
+        # followed by a MUSIC_HALTED_EVENT in the same queue, so an end event that
+        # arrives while one of those markers is still on its way was posted before
+        # it: it belongs to music we stopped, however soon a new track started.
+        self._halts_in_flight = 0
+        self.finished_tracks = queue.Queue()
+        # Gapless/crossfade: the next playlist track, lined up from the cache
+        # before the current one ends, as (track_info, path, playlist index)
+        self.crossfade_ms = 0
+        self.queued = None
+        self.on_track_change = None
+        self._transition_timer = None
+        # The playback clock counts frames consumed by the mixer: get_pos()
+        # minus its value when the current file started, plus any seek offset
+        self._music_pos_base = 0
+        self._music_offset_ms = 0
+        # Everything that changes the player runs as a command on its own thread,
+        # one at a time, so the prompt, jobs, mixer end events and crossfade
+        # timers never race each other; readers use the published `state`
+        self.state = self._snapshot()
+        self._commands = queue.Queue()
+        self._actor = threading.Thread(target=self._run_commands, name="player", daemon=True)
+        self._actor.start()
+        self._event_thread = threading.Thread(target=self._watch_events, daemon=True)
+        self._event_thread.start()
     
-    def play(self, video_id, track_info=None):
-        """Play a track from YouTube video ID"""
+    def _snapshot(self):
+        return PlayerState(self.current_track, self.current_index, self.playlist, self.is_playing,
+                           self.is_paused, self.get_volume(), self.length_ms)
+    
+    def _run_commands(self):
+        """The player thread: apply commands in order and publish the state after each"""
+        while True:
+            command = self._commands.get()
+            if command is None:
+                break
+            fn, args, kwargs, future = command
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                if future:
+                    future.set_exception(e)
+                else:
+                    print(f"Player error: {e}")
+            else:
+                if future:
+                    future.set_result(result)
+            self.state = self._snapshot()
+    
+    def _send(self, fn, *args, **kwargs):
+        """Run fn on the player thread and return its result (directly if already on it)"""
+        if threading.current_thread() is self._actor:
+            return fn(*args, **kwargs)
+        future = Future()
+        self._commands.put((fn, args, kwargs, future))
+        return future.result()
+    
+    def _post(self, fn, *args):
+        """Queue fn for the player thread without waiting for it"""
+        self._commands.put((fn, args, {}, None))
+    
+    def _watch_events(self):
+        """Block on pygame's event queue and publish natural track ends"""
+        pygame.display.init()
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed([TRACK_END_EVENT, MUSIC_HALTED_EVENT, pygame.QUIT])
+        pygame.mixer.music.set_endevent(TRACK_END_EVENT)
+        while True:
+            event = pygame.event.wait()
+            if event.type == pygame.QUIT:
+                break
+            if event.type == TRACK_END_EVENT:
+                self._post(self._music_ended)
+            elif event.type == MUSIC_HALTED_EVENT:
+                self._post(self._music_halted)
+    
+    def _music_halted(self):
+        """Every end event posted before this halt's marker has been handled"""
+        self._halts_in_flight -= 1
+    
+    def _music_ended(self):
+        """Handle the mixer's end event on the player thread"""
+        # Ignore the ends of music we stopped, and the fade-out under a crossfade
+        if self._halts_in_flight or self.stream:
+            return
+        if pygame.mixer.music.get_busy():
+            # The mixer switched to the queued file without a gap
+            if self._queued_is_next():
+                self._music_pos_base = pygame.mixer.music.get_pos()
+                self._music_offset_ms = 0
+                self._take_queued()
+            else:
+                # It started a file lined up for a playlist position that has since changed
+                self._halt_music()
+                self._track_finished()
+        elif self.is_playing:
+            self._track_finished()
+    
+    def _stream_finished(self):
+        """Called from a stream's feeder thread when it runs out"""
+        self._post(self._stream_ended)
+    
+    def _stream_ended(self):
+        """Handle the end of a stream on the player thread, unless it was replaced meanwhile"""
+        if self.stream and self.stream.finished:
+            self._track_finished()
+    
+    def _track_finished(self):
+        """Mark the current track as ended and notify waiters"""
+        if self._queued_is_next():
+            # The next track is already cached, so switch to it right here
+            self._stop_stream()
+            self._start_music(self.queued[1])
+            self._take_queued()
+            return
+        self._clear_queued()
+        self.is_playing = False
+        # If the playlist moved on meanwhile (a new selection is loading), auto-play
+        # must not advance past it
+        if self.track_index == self.current_index:
+            self.finished_tracks.put(self._snapshot())
+    
+    def _take_queued(self):
+        """Make the queued track the current one after an automatic transition"""
+        track_info, path, index = self.queued
+        self.queued = None
+        self.current_track = track_info
+        self.current_file = path
+        self.current_index = index
+        self.track_index = index
+        self.cache.pin(path)
+        self.length_ms = self.cache.duration_ms(path) or 0
+        self.is_playing = True
+        self.is_paused = False
+        if self.on_track_change:
+            self.on_track_change(track_info)
+    
+    def _queued_is_next(self):
+        """Whether the lined-up track is still the one after the current playlist position"""
+        return (self.queued is not None and self.queued[2] == self.current_index + 1
+                and self.queued[2] < len(self.playlist))
+    
+    def _clear_queued(self):
+        """Forget the lined-up track and any pending crossfade"""
+        self.queued = None
+        if self._transition_timer:
+            self._transition_timer.cancel()
+            self._transition_timer = None
+    
+    @_command
+    def queue_next(self, track_info, index):
+        """Line up the next playlist track (already cached) for a gapless or crossfaded change"""
+        if index != self.current_index + 1 or not self.current_track:
+            return False
+        if self.queued and self.queued[2] == index and self.queued[0].id == track_info.id:
+            return True
+        
+        path = self.cache.get(track_info.id, AUDIO_FORMAT)
+        if not path:
+            return False
+        
+        self._clear_queued()
+        self.queued = (track_info, path, index)
+        if self.crossfade_ms > 0:
+            self._arm_transition()
+        elif not self.stream and self.current_file:
+            # Let the mixer start the next file the moment this one ends
+            pygame.mixer.music.queue(path)
+        return True
+    
+    def _clock_ms(self):
+        """Milliseconds of the current track the mixer has played"""
+        if self.stream:
+            return self.stream.get_time()
+        pos = pygame.mixer.music.get_pos()
+        return self._music_offset_ms + (max(0, pos - self._music_pos_base) if pos >= 0 else 0)
+    
+    def _arm_transition(self):
+        """Schedule the crossfade into the queued track against the audio clock"""
+        if self._transition_timer:
+            self._transition_timer.cancel()
+        if not self.queued or self.crossfade_ms <= 0 or not self.is_playing:
+            return
+        delay = (self.get_length() - self.crossfade_ms - self._clock_ms()) / 1000
+        self._transition_timer = threading.Timer(max(0, delay), self._post, args=(self._transition_due, self.queued))
+        self._transition_timer.daemon = True
+        self._transition_timer.start()
+    
+    def _transition_due(self, queued):
+        """Start the crossfade, or re-arm if the clock drifted (e.g. after a pause)"""
+        if self.queued is not queued or not self.is_playing:
+            return
+        if self.get_length() - self.crossfade_ms - self._clock_ms() > 20:
+            self._arm_transition()
+            return
+        self._crossfade()
+    
+    def _crossfade(self):
+        """Fade the current track out while the queued one fades in on a mixer channel"""
+        incoming = StreamingPlayback(self.queued[1], buffer_ms=self.stream_buffer_ms, volume=self.volume,
+                                     on_finish=self._stream_finished, gain=0.0)
+        incoming.start()
+        incoming.fade(1.0, self.crossfade_ms)
+        
+        if self.stream:
+            self.stream.fade(0.0, self.crossfade_ms, stop_after=True)
+        else:
+            # Its end event arrives while the incoming stream plays, so it is ignored
+            pygame.mixer.music.fadeout(self.crossfade_ms)
+        self.stream = incoming
+        self._take_queued()
+    
+    def wait_for_track_end(self, timeout=None):
+        """Block until a track finishes on its own and return the state it ended in (None on timeout or close)"""
         try:
-            # Stop current playback and clean up
-            pygame.mixer.music.stop()
-            time.sleep(0.2)  # Give more time for file to be released
-            
-            if self.current_file and os.path.exists(self.current_file):
-                try:
-                    os.remove(self.current_file)
-                except Exception as e:
-                    # If file is locked, try a different temp file name
-                    import random
-                    pass
-            
-            # Download audio to temp file for pygame with unique name
-            import random
-            temp_dir = tempfile.gettempdir()
-            temp_id = random.randint(1000, 9999)
-            output_file = os.path.join(temp_dir, f'music_player_temp_{temp_id}.mp3')
-            
-            # Remove old temp file if exists
-            if os.path.exists(output_file):
+            return self.finished_tracks.get(timeout=timeout)
+        except queue.Empty:
+            return None
+    
+    def _start_music(self, path):
+        """Load and start a file on the music stream"""
+        pygame.mixer.music.load(path)
+        self._music_pos_base = 0
+        self._music_offset_ms = 0
+        pygame.mixer.music.play()
+    
+    def _halt_music(self):
+        """Stop the music stream without it counting as a track end"""
+        # stop() posts its end event (if any) before returning, so it lands ahead of the marker
+        pygame.mixer.music.stop()
+        try:
+            posted = pygame.event.post(pygame.event.Event(MUSIC_HALTED_EVENT))
+        except pygame.error:
+            posted = False  # The event thread hasn't started, so the mixer can't have posted either
+        if posted:
+            self._halts_in_flight += 1
+    
+    def _download_pool(self, codec):
+        """Get the pool of long-lived downloaders for a target codec"""
+        with self._flights_lock:
+            if codec not in self._download_pools:
+                ydl_opts = {
+                    'format': FORMAT_SELECTORS.get(codec, 'bestaudio/best'),
+                    'outtmpl': os.path.join(str(self.cache.tmp_dir), '%(id)s.%(ext)s'),
+                    'quiet': True,
+                    'no_warnings': True,
+                    'noprogress': True,
+                    # Copies the stream when it is already in the target codec,
+                    # and only transcodes when it is not
+                    'postprocessors': [{
+                        'key': 'FFmpegExtractAudio',
+                        'preferredcodec': codec,
+                        'preferredquality': '192',
+                    }],
+                    'keepvideo': False,
+                    'progress_hooks': [lambda d: self._on_download_progress(codec, d)],
+                    'postprocessor_hooks': [lambda d: self._on_postprocess(codec, d)],
+                }
+                self._download_pools[codec] = YoutubeDLPool(ydl_opts, size=DOWNLOAD_THREADS)
+            return self._download_pools[codec]
+    
+    def _check_aborted(self, codec, d):
+        """Stop a download from inside a yt-dlp hook once nobody wants it anymore"""
+        flight = self._flights.get((d.get('info_dict', {}).get('id'), codec))
+        if flight and flight.abort.is_set():
+            from yt_dlp.utils import DownloadCancelled
+            raise DownloadCancelled()
+    
+    def _on_download_progress(self, codec, d):
+        """yt-dlp progress hook: abort cancelled downloads and split extraction from the download"""
+        self._check_aborted(codec, d)
+        if not tracer.enabled:
+            return
+        video_id = d.get('info_dict', {}).get('id')
+        started = self._fetch_started.pop(video_id, None)
+        if started is not None:
+            # The first progress report marks the end of extraction
+            tracer.record('fetch.extract', (time.perf_counter() - started) * 1000)
+        if d.get('status') == 'finished' and d.get('elapsed') is not None:
+            tracer.record('fetch.download', d['elapsed'] * 1000)
+    
+    def _on_postprocess(self, codec, d):
+        """yt-dlp postprocessor hook: don't start FFmpeg for cancelled downloads, and time it"""
+        if d.get('status') == 'started':
+            self._check_aborted(codec, d)
+        if not tracer.enabled:
+            return
+        key = (d.get('info_dict', {}).get('id'), d.get('postprocessor'))
+        if d.get('status') == 'started':
+            self._postprocess_started[key] = time.perf_counter()
+        elif d.get('status') == 'finished' and key in self._postprocess_started:
+            started = self._postprocess_started.pop(key)
+            tracer.record('fetch.ffmpeg', (time.perf_counter() - started) * 1000)
+    
+    def _cached_info(self, video_id):
+        """Info already extracted by the source, if it is still valid"""
+        return self.info_cache.get(video_id) if self.info_cache else None
+    
+    def is_cached(self, video_id, codec=AUDIO_FORMAT):
+        """Check whether a track can play without downloading it"""
+        return self.cache.contains(video_id, codec)
+    
+    def fetch(self, video_id, codec=AUDIO_FORMAT, cancelled=None):
+        """Return a local audio file for a track, downloading it on a cache miss"""
+        cached = self.cache.get(video_id, codec)
+        if cached:
+            tracer.count('audio_cache.hit')
+            return cached
+        
+        if self.offline:
+            raise NotCached(f"{video_id} is not downloaded")
+        
+        if cancelled and cancelled():
+            raise JobCancelled()
+        
+        key = (video_id, codec)
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            if flight is None or flight.abort.is_set():
+                tracer.count('audio_cache.miss')
+                # An aborted download of the same file has to finish tearing down first
+                flight = _Flight(previous=flight)
+                self._flights[key] = flight
+                self._download_executor.submit(self._download, video_id, codec, flight)
+            else:
+                tracer.count('audio_cache.joined')
+            flight.waiters += 1
+        
+        # A caller whose cancelled() turns true stops waiting; once every caller
+        # has, the download and its FFmpeg process are aborted
+        try:
+            while not flight.done.wait(CANCEL_POLL_INTERVAL):
+                if cancelled and cancelled():
+                    raise JobCancelled()
+        except JobCancelled:
+            with self._flights_lock:
+                flight.waiters -= 1
+                if flight.waiters == 0 and not flight.done.is_set():
+                    flight.abort.set()
+                    self._release_slot(flight)
+                    _kill_children_using(os.path.join(str(self.cache.tmp_dir), video_id))
+            raise
+        
+        with self._flights_lock:
+            flight.waiters -= 1
+        if flight.error:
+            raise flight.error
+        return flight.result
+    
+    def _download(self, video_id, codec, flight):
+        """Run one shared download on the download pool and publish its outcome"""
+        try:
+            if flight.previous:
+                flight.previous.done.wait()
+            while not self._download_slots.acquire(timeout=CANCEL_POLL_INTERVAL):
+                if flight.abort.is_set():
+                    raise JobCancelled()
+            with self._flights_lock:
+                flight.holds_slot = True
+            flight.result = self.cache.get(video_id, codec) or self._download_file(video_id, codec, flight)
+        except Exception as e:
+            if flight.abort.is_set():
+                flight.error = JobCancelled()
+                self._remove_partial_files(video_id)
+            else:
+                flight.error = e
+        finally:
+            self._fetch_started.pop(video_id, None)
+            with self._flights_lock:
+                self._release_slot(flight)
+                if self._flights.get((video_id, codec)) is flight:
+                    del self._flights[(video_id, codec)]
+            flight.done.set()
+    
+    def _release_slot(self, flight):
+        """Give a download's slot to the next one (called with _flights_lock held)"""
+        if flight.holds_slot:
+            flight.holds_slot = False
+            self._download_slots.release()
+    
+    def _download_file(self, video_id, codec, flight):
+        """Download and convert one track into the cache with yt-dlp"""
+        if flight.abort.is_set():
+            raise JobCancelled()
+        if tracer.enabled:
+            self._fetch_started[video_id] = time.perf_counter()
+        
+        from yt_dlp.utils import DownloadError
+        
+        output_file = os.path.join(str(self.cache.tmp_dir), f'{video_id}.{codec}')
+        youtube_url = f"https://www.youtube.com/watch?v={video_id}"
+        
+        # Download the audio with a pooled downloader, reusing already
+        # extracted info (and its signed URLs) when the source has it
+        with tracer.span('fetch.total'), self._download_pool(codec).acquire() as ydl:
+            info = self._cached_info(video_id)
+            if info is not None:
                 try:
-                    os.remove(output_file)
-                except:
-                    pass
-            
-            ydl_opts = {
-                'format': 'bestaudio/best',
-                'outtmpl': output_file.replace('.mp3', '.%(ext)s'),
-                'quiet': True,
-                'no_warnings': True,
-                'noprogress': True,
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                }],
-                'keepvideo': False,
-            }
-            
-            # Build YouTube URL
-            youtube_url = f"https://www.youtube.com/watch?v={video_id}"
-            
-            # Download the audio
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                    ydl.process_ie_result(ydl.sanitize_info(info), download=True)
+                except DownloadError:
+                    # The signed URLs stopped working early; extract again below
+                    self.info_cache.invalidate(video_id)
+                    info = None
+            if info is None:
                 info = ydl.extract_info(youtube_url, download=True)
+                if self.info_cache:
+                    self.info_cache.put(video_id, info)
+        
+        # The file should now be in the target codec
+        if not os.path.exists(output_file):
+            # Check for the file without extension change
+            base = output_file.replace(f'.{codec}', '')
+            for ext in ['.opus', '.ogg', '.mp3', '.flac', '.wav']:
+                test_file = base + ext
+                if os.path.exists(test_file):
+                    output_file = test_file
+                    break
+            else:
+                raise Exception(f"Downloaded file not found. Checked: {base}.*")
+        
+        duration = info.get('duration') if info else None
+        return self.cache.put(video_id, codec, output_file,
+                              duration_ms=int(duration * 1000) if duration else None)
+    
+    def _remove_partial_files(self, video_id):
+        """Delete what an aborted download left in the temp directory"""
+        for path in Path(self.cache.tmp_dir).glob(f"{video_id}.*"):
+            try:
+                path.unlink()
+            except OSError:
+                pass
+    
+    def _stop_stream(self):
+        """Stop the active stream, if any"""
+        if self.stream:
+            self.stream.stop()
+            self.stream = None
+    
+    def play(self, video_id, track_info=None):
+        """Play a track from YouTube video ID"""
+        generation = next(self._play_generations)
+        self._play_generation = generation
+        job = current_job()
+        superseded = lambda: generation != self._play_generation or (job is not None and job.cancelled)
+        
+        if self.offline and not self.is_cached(video_id):
+            print(f"Offline: {track_info.title if track_info else video_id} is not downloaded")
+            return False
+        
+        if (self.streaming and self.stream_resolver and
+                not self.cache.contains(video_id, AUDIO_FORMAT)):
+            return self.play_stream(video_id, track_info, superseded)
+        
+        try:
+            # Cache hits (and finished prefetches) skip yt-dlp entirely.
+            # The current track keeps playing until the next one is ready,
+            # and its download is dropped if another track is asked for first.
+            with tracer.span('play.fetch'):
+                output_file = self.fetch(video_id, cancelled=superseded)
             
-            # The file should be converted to mp3
-            if not os.path.exists(output_file):
-                # Check for the file without extension change
-                base = output_file.replace('.mp3', '')
-                for ext in ['.mp3', '.m4a', '.webm', '.opus', '.ogg']:
-                    test_file = base + ext
-                    if os.path.exists(test_file):
-                        output_file = test_file
-                        break
-                else:
-                    raise Exception(f"Downloaded file not found. Checked: {base}.*")
-            
-            # Load and play
-            pygame.mixer.music.load(output_file)
-            pygame.mixer.music.play()
-            
-            self.current_track = track_info
-            self.current_file = output_file
-            self.is_playing = True
-            self.is_paused = False
-            self.start_time = time.time()
-            self.paused_time = 0
-            
-            return True
+            with tracer.span('play.switch'):
+                return self._send(self._switch_to_file, output_file, track_info, superseded)
+        except JobCancelled:
+            raise
         except Exception as e:
             print(f"Playback error: {e}")
             return False
     
+    def _switch_to_file(self, output_file, track_info, superseded):
+        """Replace whatever is playing with a cached file (player thread)"""
+        if superseded():
+            raise JobCancelled()
+        self._clear_queued()
+        self._stop_stream()
+        self._halt_music()
+        self._start_music(output_file)
+        self.cache.pin(output_file)
+        
+        self.current_track = track_info
+        self.track_index = self.current_index
+        self.current_file = output_file
+        self.length_ms = self.cache.duration_ms(output_file) or 0
+        self.is_playing = True
+        self.is_paused = False
+        return True
+    
+    def play_stream(self, video_id, track_info=None, superseded=None):
+        """Play a track progressively while it is still downloading"""
+        try:
+            with tracer.span('play.stream_url'):
+                url = self.stream_resolver(video_id)
+            if not url:
+                raise Exception("Could not resolve stream URL")
+            
+            with tracer.span('play.stream_start'):
+                return self._send(self._switch_to_stream, url, track_info, superseded)
+        except JobCancelled:
+            raise
+        except Exception as e:
+            print(f"Streaming error: {e}")
+            return False
+    
+    def _switch_to_stream(self, url, track_info, superseded):
+        """Replace whatever is playing with a stream URL (player thread)"""
+        if superseded and superseded():
+            raise JobCancelled()
+        self._clear_queued()
+        self._stop_stream()
+        self._halt_music()
+        
+        self.stream = StreamingPlayback(url, buffer_ms=self.stream_buffer_ms, volume=self.volume,
+                                        on_finish=self._stream_finished)
+        self.stream.start()
+        self.cache.pin(None)
+        
+        self.current_track = track_info
+        self.track_index = self.current_index
+        self.current_file = None
+        self.length_ms = 0
+        self.is_playing = True
+        self.is_paused = False
+        return True
+    
+    def stream_stats(self):
+        """Buffer counters of the active stream, or None when not streaming"""
+        return self.stream.stats() if self.stream else None
+    
+    def _supersede_pending(self):
+        """Drop a play() that hasn't switched tracks yet, and abort its download (player thread)"""
+        self._play_generation = next(self._play_generations)
+    
+    @_command
     def pause(self):
         """Pause playback"""
+        self._supersede_pending()
         if self.is_playing:
+            if self.stream:
+                self.stream.pause()
             pygame.mixer.music.pause()
             self.is_playing = False
             self.is_paused = True
-            self.paused_time = time.time()
     
+    @_command
     def resume(self):
         """Resume playback"""
-        if not self.is_playing and pygame.mixer.music.get_busy():
+        if not self.is_playing and self.stream:
+            self.stream.resume()
+            self.is_playing = True
+            self.is_paused = False
+            self._arm_transition()
+        elif self.is_paused:
             pygame.mixer.music.unpause()
             self.is_playing = True
             self.is_paused = False
-        elif not self.is_playing:
-            pygame.mixer.music.play()
+            self._arm_transition()
+        elif not self.is_playing and self.current_file:
+            self._start_music(self.current_file)
             self.is_playing = True
             self.is_paused = False
     
+    @_command
     def stop(self):
         """Stop playback"""
-        pygame.mixer.music.stop()
+        self._supersede_pending()
         self.is_playing = False
+        self._clear_queued()
+        self._stop_stream()
+        self._halt_music()
         self.is_paused = False
         self.current_track = None
-        self.playlist = []  # Clear playlist when stopped
+        self.playlist = ()  # Clear playlist when stopped
+        self.playlist_load = next(self._playlist_loads)
         self.current_index = -1
-        if self.current_file and os.path.exists(self.current_file):
-            try:
-                os.remove(self.current_file)
-            except:
-                pass
+        self.track_index = -1
+        self.current_file = None
+        self.length_ms = 0
+        self.cache.pin(None)
     
+    def close(self):
+        """Stop playback and release waiters, the player thread and the event thread"""
+        self.stop()
+        with self._flights_lock:
+            for flight in self._flights.values():
+                flight.abort.set()
+        self._download_executor.shutdown(wait=False)
+        self._commands.put(None)
+        pygame.event.post(pygame.event.Event(pygame.QUIT))
+        self.finished_tracks.put(None)
+    
+    @_command
     def set_volume(self, volume):
         """Set volume (0-100)"""
         self.volume = max(0, min(100, volume)) / 100.0
         pygame.mixer.music.set_volume(self.volume)
+        if self.stream:
+            self.stream.set_volume(self.volume)
     
     def get_volume(self):
         """Get current volume"""
@@ -148,57 +754,111 @@ class MusicPlayer:
         """Get current playback position (0.0 to 1.0)"""
         if not self.current_track:
             return 0.0
-        pos = pygame.mixer.music.get_pos() / 1000.0
-        return min(1.0, pos / 180.0)  # Estimate
+        return min(1.0, self.get_time() / self.get_length())
     
     def set_position(self, position):
         """Set playback position (0.0 to 1.0)"""
-        pygame.mixer.music.set_pos(position)
+        return self.seek(int(position * self.get_length()))
+    
+    @_command
+    def seek(self, ms):
+        """Jump to ms into the current track"""
+        if not self.current_track:
+            return False
+        ms = max(0, min(int(ms), self.get_length() - 1000))
+        try:
+            if self.stream:
+                # ffmpeg seeks within the source (cached file or stream URL)
+                old = self.stream
+                self.stream = StreamingPlayback(old.url, buffer_ms=self.stream_buffer_ms, volume=self.volume,
+                                                on_finish=self._stream_finished, start_ms=ms)
+                old.stop()
+                if self.is_paused:
+                    self.stream.pause()
+                self.stream.start()
+            elif self.current_file:
+                # Ogg and MP3 positions are absolute, in seconds
+                pygame.mixer.music.set_pos(ms / 1000)
+                self._music_pos_base = max(0, pygame.mixer.music.get_pos())
+                self._music_offset_ms = ms
+            else:
+                return False
+        except Exception as e:
+            print(f"Seek error: {e}")
+            return False
+        self._arm_transition()
+        return True
     
     def get_time(self):
         """Get current playback time in milliseconds"""
-        if self.is_playing:
-            return int((time.time() - self.start_time) * 1000)
-        return 0
+        if not self.current_track:
+            return 0
+        return self._clock_ms()
     
     def get_length(self):
         """Get track length in milliseconds"""
-        # Estimate from duration string
-        if self.current_track and 'duration' in self.current_track:
-            duration = self.current_track['duration']
-            if ':' in str(duration):
-                parts = str(duration).split(':')
-                if len(parts) == 2:
-                    mins, secs = parts
-                    return (int(mins) * 60 + int(secs)) * 1000
+        if self.length_ms:
+            return self.length_ms
+        if self.current_track and self.current_track.duration_ms:
+            return self.current_track.duration_ms
         return 180000  # Default 3 minutes
     
     def is_playing_state(self):
         """Check if currently playing"""
+        if self.stream:
+            return self.is_playing and self.stream.is_active()
         return self.is_playing and pygame.mixer.music.get_busy()
     
+    @_command
     def load_playlist(self, tracks):
-        """Load a playlist"""
-        self.playlist = tracks
+        """Load a playlist and return its load number, for extend_playlist"""
+        self._clear_queued()
+        self.playlist = tuple(tracks)
+        self.playlist_load = next(self._playlist_loads)
         self.current_index = -1
+        self.track_index = -1
+        return self.playlist_load
     
+    @_command
+    def extend_playlist(self, load, tracks):
+        """Append tracks to the playlist loaded as `load`; False if another playlist replaced it"""
+        if load != self.playlist_load:
+            return False
+        self.playlist += tuple(tracks)
+        return True
+    
+    @_command
     def shuffle_playlist(self):
         """Shuffle the current playlist"""
         import random
         if self.playlist:
-            random.shuffle(self.playlist)
+            self._clear_queued()
+            self.playlist = tuple(random.sample(self.playlist, len(self.playlist)))
             self.current_index = -1
+            self.track_index = -1
     
-    def play_next(self):
-        """Play next track in playlist"""
+    @_command
+    def play_next(self, after=None):
+        """Move to the next playlist track and return it; with after=index, only if still at that index"""
+        if after is not None and after != self.current_index:
+            return None
         if self.current_index < len(self.playlist) - 1:
+            self._clear_queued()
             self.current_index += 1
             return self.playlist[self.current_index]
         return None
     
+    @_command
+    def set_index(self, index):
+        """Move the playlist cursor, e.g. after playing a playlist track picked by hand"""
+        self._clear_queued()
+        self.current_index = index
+    
+    @_command
     def play_previous(self):
         """Play previous track in playlist"""
         if self.current_index > 0:
+            self._clear_queued()
             self.current_index -= 1
             return self.playlist[self.current_index]
         return None
@@ -0,0 +1,80 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from jobs import JobCancelled
+from cache import NotCached
+
+
+class Prefetcher:
+    """Downloads upcoming playlist tracks into the audio cache in the background"""
+
+    def __init__(self, fetch, resolve=None, lookahead=2, workers=2, on_ready=None):
+        self.fetch = fetch
+        self.resolve = resolve
+        self.on_ready = on_ready
+        self.lookahead = lookahead
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="prefetch")
+        self.lock = threading.Lock()
+        # track id -> (future, event set when the track is no longer wanted)
+        self.pending = {}
+        # Ids fetched while in the window; forgotten once they leave it, since the
+        # cache may evict them later and they would never be fetched again
+        self.ready = set()
+
+    def update(self, playlist, current_index):
+        """Prefetch the tracks after current_index, dropping ones that left the window"""
+        window = playlist[current_index + 1:current_index + 1 + self.lookahead] if self.lookahead > 0 else []
+        wanted = {track.id: track for track in window if track.id}
+
+        with self.lock:
+            # Tracks that are no longer coming up (shuffle, prev, new playlist)
+            for track_id in list(self.pending):
+                if track_id not in wanted:
+                    self._cancel(track_id)
+            self.ready.intersection_update(wanted)
+
+            for track_id, track in wanted.items():
+                if track_id not in self.pending and track_id not in self.ready:
+                    stop = threading.Event()
+                    self.pending[track_id] = (self.executor.submit(self._prefetch, track, stop), stop)
+
+    def _cancel(self, track_id):
+        """Drop a queued prefetch, or abort its download if it already started"""
+        future, stop = self.pending.pop(track_id)
+        future.cancel()
+        stop.set()
+
+    def _prefetch(self, track, stop):
+        """Resolve and download a single track"""
+        try:
+            play_track = self.resolve(track) if self.resolve else track
+            if play_track and not stop.is_set():
+                self.fetch(play_track.id, stop.is_set)
+                with self.lock:
+                    self.ready.add(track.id)
+                if self.on_ready:
+                    self.on_ready(track)
+        except (JobCancelled, NotCached):
+            pass
+        except Exception as e:
+            print(f"Prefetch error: {e}")
+        finally:
+            with self.lock:
+                if track.id in self.pending and self.pending[track.id][1] is stop:
+                    del self.pending[track.id]
+
+    def is_ready(self, track):
+        """Check whether a track has already been prefetched"""
+        with self.lock:
+            return track.id in self.ready
+
+    def reset(self):
+        """Cancel queued prefetches and forget finished ones"""
+        with self.lock:
+            for track_id in list(self.pending):
+                self._cancel(track_id)
+            self.ready.clear()
+
+    def shutdown(self):
+        """Stop the worker pool"""
+        self.reset()
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,168 @@
+import os
+import json
+import time
+import threading
+from difflib import SequenceMatcher
+from concurrent.futures import Future, ThreadPoolExecutor
+from config import CACHE_DIR
+from track import Track
+from tracing import tracer
+
+RESOLUTION_INDEX_FILE = CACHE_DIR / "resolutions.json"
+
+# Below this confidence the best match is still used, but not remembered
+MIN_CONFIDENCE = 0.5
+
+
+def _normalize(text):
+    return ' '.join(str(text).lower().replace('-', ' ').split())
+
+
+def match_confidence(track, candidate):
+    """Score (0.0 to 1.0) how likely a YouTube result is the same recording as a track"""
+    title = SequenceMatcher(None, _normalize(track.title), _normalize(candidate.title)).ratio()
+    artist = SequenceMatcher(None, _normalize(track.artist), _normalize(candidate.artist)).ratio()
+
+    duration = 0.5
+    if track.duration_ms and candidate.duration_ms:
+        duration = max(0.0, 1.0 - abs(track.duration_ms - candidate.duration_ms) / 10000.0)
+
+    return round(0.5 * title + 0.3 * artist + 0.2 * duration, 3)
+
+
+class ResolutionIndex:
+    """Persistent mapping from Spotify track id (and ISRC) to a YouTube track"""
+
+    def __init__(self, path=RESOLUTION_INDEX_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.tracks = {}
+        self.isrcs = {}
+        self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            self.tracks = data.get('tracks', {})
+            self.isrcs = data.get('isrc', {})
+        except Exception as e:
+            print(f"Resolution index error: {e}")
+
+    def save(self):
+        """Atomically write the index"""
+        with self.lock:
+            data = {'tracks': self.tracks, 'isrc': self.isrcs}
+            tmp_file = self.path.with_suffix('.tmp')
+            with open(tmp_file, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_file, self.path)
+
+    def get(self, track):
+        """Look up a resolved entry by Spotify id, falling back to ISRC"""
+        with self.lock:
+            entry = self.tracks.get(track.id)
+            if not entry and track.isrc:
+                spotify_id = self.isrcs.get(track.isrc)
+                entry = self.tracks.get(spotify_id) if spotify_id else None
+            return entry
+
+    def put(self, track, youtube_track, confidence, save=True):
+        """Remember a resolution"""
+        with self.lock:
+            self.tracks[track.id] = {
+                'video_id': youtube_track.id,
+                'confidence': confidence,
+                'isrc': track.isrc,
+                'resolved_at': time.time(),
+                'youtube': youtube_track.to_dict(),
+            }
+            if track.isrc:
+                self.isrcs[track.isrc] = track.id
+        if save:
+            self.save()
+
+
+class TrackResolver:
+    """Resolves Spotify tracks to playable YouTube tracks, remembering every answer"""
+
+    def __init__(self, youtube, index=None, workers=4):
+        self.youtube = youtube
+        self.index = index or ResolutionIndex()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="resolve")
+        # Searches in flight by Spotify id, so concurrent callers share one
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        # Offline mode: only answers already in the index are used
+        self.offline = False
+
+    def is_resolved(self, track):
+        """Check whether a track can be played without a search"""
+        return track.source != 'spotify' or self.index.get(track) is not None
+
+    def resolve(self, track, save=True):
+        """Return the YouTube track used to play a (possibly Spotify) track"""
+        if track.source != 'spotify':
+            return track
+
+        entry = self.index.get(track)
+        if entry:
+            tracer.count('resolution.hit')
+            return Track.from_dict(entry['youtube'])
+        if self.offline:
+            return None
+
+        with self.lock:
+            future = self.in_flight.get(track.id)
+            owner = future is None
+            if owner:
+                future = self.in_flight[track.id] = Future()
+        if not owner:
+            tracer.count('resolution.joined')
+            return future.result()
+
+        tracer.count('resolution.miss')
+        try:
+            best = self._search(track, save)
+            future.set_result(best)
+            return best
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[track.id]
+
+    def _search(self, track, save):
+        """Find the best YouTube match for a track and remember it if it is good enough"""
+        # The index remembers the answer, so the search cache is left to searches the
+        # user typed; an import would otherwise evict all of them
+        candidates = self.youtube.search(f"{track.title} {track.artist}", limit=5, remember=False)
+        if not candidates:
+            return None
+        scored = [(match_confidence(track, candidate), candidate) for candidate in candidates]
+        confidence, best = max(scored, key=lambda item: item[0])
+        if confidence >= MIN_CONFIDENCE:
+            self.index.put(track, best, confidence, save=save)
+        return best
+
+    def resolve_many(self, tracks):
+        """Resolve every unresolved track concurrently and save the index once"""
+        pending = [t for t in tracks if not self.is_resolved(t)]
+        if not pending:
+            return 0
+        resolved = sum(1 for result in self.executor.map(lambda t: self.resolve(t, save=False), pending) if result)
+        self.index.save()
+        return resolved
+
+    def resolve_in_background(self, tracks):
+        """Start resolving a playlist without blocking the caller"""
+        thread = threading.Thread(target=self.resolve_many, args=(list(tracks),), daemon=True)
+        thread.start()
+        return thread
+
+    def shutdown(self):
+        """Stop the worker pool"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from config import CONFIG_DIR, PLAYLISTS_FILE, ensure_config_dir
+from track import Track
+
+PLAYLIST_DB_FILE = CONFIG_DIR / "playlists.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS playlists (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS playlist_tracks (
+    playlist_id INTEGER NOT NULL REFERENCES playlists(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    track TEXT NOT NULL,
+    PRIMARY KEY (playlist_id, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS imports (
+    source_id TEXT PRIMARY KEY,
+    playlist_id INTEGER NOT NULL REFERENCES playlists(id) ON DELETE CASCADE,
+    total INTEGER NOT NULL,
+    started REAL NOT NULL
+);
+"""
+
+
+class PlaylistStore:
+    """SQLite playlist store with one row per track, so appends never rewrite a playlist"""
+
+    def __init__(self, path=PLAYLIST_DB_FILE, legacy_file=PLAYLISTS_FILE):
+        ensure_config_dir()
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        # WAL keeps every write atomic and crash-safe without blocking readers
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+        self._migrate(legacy_file)
+
+    def _migrate(self, legacy_file):
+        """Import an old playlists.json in one transaction, then move it aside"""
+        if not legacy_file or not legacy_file.exists():
+            return
+        try:
+            with open(legacy_file, 'r') as f:
+                playlists = json.load(f)
+            with self.lock, self.conn:
+                for name, tracks in playlists.items():
+                    playlist_id = self._insert_playlist(name)
+                    if playlist_id is None:
+                        continue
+                    self.conn.executemany(
+                        "INSERT INTO playlist_tracks (playlist_id, position, track) VALUES (?, ?, ?)",
+                        [(playlist_id, position, json.dumps(track)) for position, track in enumerate(tracks)]
+                    )
+            os.replace(legacy_file, legacy_file.with_suffix('.json.migrated'))
+        except Exception as e:
+            print(f"Playlist migration error: {e}")
+
+    def _insert_playlist(self, name):
+        """Create a playlist row, returning its id (None if the name is taken)"""
+        cursor = self.conn.execute(
+            "INSERT OR IGNORE INTO playlists (name, created) VALUES (?, ?)", (name, time.time())
+        )
+        return cursor.lastrowid if cursor.rowcount else None
+
+    def _playlist_id(self, name):
+        row = self.conn.execute("SELECT id FROM playlists WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def __contains__(self, name):
+        with self.lock:
+            return self._playlist_id(name) is not None
+
+    def create(self, name):
+        """Create an empty playlist; returns False if it already exists"""
+        with self.lock, self.conn:
+            return self._insert_playlist(name) is not None
+
+    def append(self, name, track):
+        """Add a track to the end of a playlist; returns False if there is no such playlist"""
+        with self.lock, self.conn:
+            playlist_id = self._playlist_id(name)
+            if playlist_id is None:
+                return False
+            # MAX over the primary key is a single index lookup
+            self.conn.execute(
+                "INSERT INTO playlist_tracks (playlist_id, position, track) "
+                "SELECT ?, COALESCE(MAX(position), -1) + 1, ? FROM playlist_tracks WHERE playlist_id = ?",
+                (playlist_id, json.dumps(track.to_dict()), playlist_id)
+            )
+            return True
+
+    def extend(self, name, tracks):
+        """Add tracks to the end of a playlist in one transaction; returns the new length (None if no playlist)"""
+        with self.lock, self.conn:
+            playlist_id = self._playlist_id(name)
+            if playlist_id is None:
+                return None
+            start = self.conn.execute(
+                "SELECT COALESCE(MAX(position), -1) + 1 FROM playlist_tracks WHERE playlist_id = ?", (playlist_id,)
+            ).fetchone()[0]
+            self.conn.executemany(
+                "INSERT INTO playlist_tracks (playlist_id, position, track) VALUES (?, ?, ?)",
+                [(playlist_id, position, json.dumps(track.to_dict())) for position, track in enumerate(tracks, start)]
+            )
+            return start + len(tracks)
+
+    def start_import(self, source_id, name, total):
+        """Create the playlist an import fills, or reopen an interrupted one; returns its track count (None if the name is taken)"""
+        with self.lock, self.conn:
+            row = self.conn.execute(
+                "SELECT p.name, COUNT(t.position) FROM imports i JOIN playlists p ON p.id = i.playlist_id "
+                "LEFT JOIN playlist_tracks t ON t.playlist_id = p.id WHERE i.source_id = ? GROUP BY p.id",
+                (source_id,)
+            ).fetchone()
+            if row and row[0] == name:
+                self.conn.execute("UPDATE imports SET total = ? WHERE source_id = ?", (total, source_id))
+                return row[1]
+            playlist_id = self._insert_playlist(name)
+            if playlist_id is None:
+                return None
+            self.conn.execute(
+                "INSERT OR REPLACE INTO imports (source_id, playlist_id, total, started) VALUES (?, ?, ?, ?)",
+                (source_id, playlist_id, total, time.time())
+            )
+            return 0
+
+    def finish_import(self, source_id):
+        """Forget the checkpoint of a completed import"""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM imports WHERE source_id = ?", (source_id,))
+
+    def import_target(self, source_id):
+        """Name of the playlist an unfinished import of source_id is filling, if any"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT p.name FROM imports i JOIN playlists p ON p.id = i.playlist_id WHERE i.source_id = ?",
+                (source_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def tracks(self, name):
+        """Load the tracks of one playlist in order, or None if it doesn't exist"""
+        with self.lock:
+            playlist_id = self._playlist_id(name)
+            if playlist_id is None:
+                return None
+            rows = self.conn.execute(
+                "SELECT track FROM playlist_tracks WHERE playlist_id = ? ORDER BY position", (playlist_id,)
+            ).fetchall()
+        return [Track.from_dict(json.loads(row[0])) for row in rows]
+
+    def counts(self):
+        """Track count of every playlist, in creation order"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT p.name, COUNT(t.position) FROM playlists p "
+                "LEFT JOIN playlist_tracks t ON t.playlist_id = p.id GROUP BY p.id ORDER BY p.id"
+            ).fetchall()
+        return dict(rows)
+
+    def close(self):
+        """Close the database"""
+        with self.lock:
+            self.conn.close()
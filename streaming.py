@@ -0,0 +1,317 @@
+import time
+import threading
+import subprocess
+import pygame
+
+
+class PCMRingBuffer:
+    """Fixed-size byte ring buffer between the decoder and the mixer feeder"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.data = bytearray(capacity)
+        self.read_pos = 0
+        self.size = 0
+        self.eof = False
+        self.closed = False
+        self.cond = threading.Condition()
+
+    def write(self, chunk):
+        """Append PCM data, blocking while the buffer is full"""
+        view = memoryview(chunk)
+        while view:
+            with self.cond:
+                while self.size == self.capacity and not self.closed:
+                    self.cond.wait()
+                if self.closed:
+                    return
+                write_pos = (self.read_pos + self.size) % self.capacity
+                n = min(len(view), self.capacity - self.size, self.capacity - write_pos)
+                self.data[write_pos:write_pos + n] = view[:n]
+                self.size += n
+                view = view[n:]
+                self.cond.notify_all()
+
+    def read(self, n):
+        """Take up to n bytes without blocking"""
+        with self.cond:
+            n = min(n, self.size)
+            first = min(n, self.capacity - self.read_pos)
+            out = bytes(self.data[self.read_pos:self.read_pos + first])
+            if n > first:
+                out += bytes(self.data[:n - first])
+            self.read_pos = (self.read_pos + n) % self.capacity
+            self.size -= n
+            self.cond.notify_all()
+            return out
+
+    def wait_for(self, n, timeout=None):
+        """Wait until n bytes are buffered or the stream has ended"""
+        with self.cond:
+            return self.cond.wait_for(lambda: self.size >= n or self.eof or self.closed, timeout)
+
+    def finish(self):
+        """Mark the end of the decoded stream"""
+        with self.cond:
+            self.eof = True
+            self.cond.notify_all()
+
+    def close(self):
+        """Drop buffered data and wake up any blocked writer"""
+        with self.cond:
+            self.closed = True
+            self.size = 0
+            self.cond.notify_all()
+
+    def available(self):
+        """Number of buffered bytes"""
+        with self.cond:
+            return self.size
+
+
+class StreamingPlayback:
+    """Decodes an audio stream (URL or local file) with ffmpeg and feeds it to a mixer channel in chunks"""
+
+    def __init__(self, url, buffer_ms=4000, chunk_ms=100, prebuffer_ms=300, volume=0.5, on_finish=None, gain=1.0,
+                 start_ms=0):
+        self.url = url
+        self.start_ms = start_ms
+        self.on_finish = on_finish
+        self.gain = gain
+        frequency, size, channels = pygame.mixer.get_init()
+        self.frequency = frequency
+        self.channels = channels
+        self.frame_bytes = abs(size) // 8 * channels
+        self.chunk_bytes = self._ms_to_bytes(chunk_ms)
+        self.prebuffer_bytes = self._ms_to_bytes(prebuffer_ms)
+        self.chunk_ms = chunk_ms
+        self.buffer = PCMRingBuffer(max(self._ms_to_bytes(buffer_ms), self.chunk_bytes * 2))
+        self.volume = volume
+        self.channel = None
+        self.process = None
+        self.paused = False
+        self.stopped = False
+        self.finished = False
+        self.underruns = 0
+        self.underrun_ms = 0
+        self.bytes_decoded = 0
+        # Playback clock: ms of chunks the channel has finished, the chunk playing now
+        # and when it started, and the chunk waiting in the channel's queue
+        self.clock_lock = threading.Lock()
+        self.played_ms = 0.0
+        self.current_ms = 0.0
+        self.current_since = None
+        self.queued_ms = 0.0
+        self.paused_at = None
+        self.started_at = None
+        self.first_audio_at = None
+
+    def _ms_to_bytes(self, ms):
+        return int(self.frequency * ms / 1000) * self.frame_bytes
+
+    def start(self):
+        """Start the decoder and feeder threads"""
+        self.started_at = time.time()
+        args = ['ffmpeg', '-loglevel', 'quiet']
+        if self.url.startswith('http'):
+            args += ['-reconnect', '1', '-reconnect_streamed', '1', '-reconnect_delay_max', '5']
+        if self.start_ms:
+            # Input seeking: ffmpeg jumps within the source instead of decoding up to the offset
+            args += ['-ss', f'{self.start_ms / 1000:.3f}']
+        args += ['-i', self.url,
+                 '-f', 's16le', '-acodec', 'pcm_s16le',
+                 '-ac', str(self.channels), '-ar', str(self.frequency), 'pipe:1']
+        self.process = subprocess.Popen(
+            args,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
+        )
+        self.channel = pygame.mixer.find_channel(True)
+        self.channel.set_volume(self.volume * self.gain)
+        threading.Thread(target=self._decode_loop, daemon=True).start()
+        threading.Thread(target=self._feed_loop, daemon=True).start()
+
+    def _decode_loop(self):
+        """Read PCM from ffmpeg into the ring buffer"""
+        try:
+            while not self.stopped:
+                data = self.process.stdout.read(self.chunk_bytes)
+                if not data:
+                    break
+                self.bytes_decoded += len(data)
+                self.buffer.write(data)
+        finally:
+            self.buffer.finish()
+
+    def _next_sound(self):
+        """Build a Sound from the next chunk of buffered PCM"""
+        data = self.buffer.read(self.chunk_bytes)
+        data = data[:len(data) - len(data) % self.frame_bytes]
+        if not data:
+            return None
+        return pygame.mixer.Sound(buffer=data)
+
+    def _play_chunk(self, sound):
+        """Start a chunk on the idle channel; anything it played before has finished"""
+        self.channel.play(sound)
+        with self.clock_lock:
+            self.played_ms += self.current_ms + self.queued_ms
+            self.current_ms = sound.get_length() * 1000
+            self.current_since = time.perf_counter()
+            self.queued_ms = 0.0
+            if self.paused:
+                self.paused_at = self.current_since
+
+    def _queue_chunk(self, sound):
+        """Queue a chunk behind the one playing"""
+        self.channel.queue(sound)
+        with self.clock_lock:
+            self.queued_ms = sound.get_length() * 1000
+
+    def _queued_chunk_started(self):
+        """The queued chunk took over when the current one ran out"""
+        with self.clock_lock:
+            if not self.queued_ms:
+                return
+            self.played_ms += self.current_ms
+            self.current_since += self.current_ms / 1000
+            self.current_ms = self.queued_ms
+            self.queued_ms = 0.0
+
+    def _feed_loop(self):
+        """Keep the mixer channel's queue topped up with PCM chunks"""
+        # Wait for the first few hundred milliseconds of audio before starting
+        self.buffer.wait_for(self.prebuffer_bytes)
+        sound = self._next_sound()
+        if sound is None or self.stopped:
+            self._finish()
+            return
+        self._play_chunk(sound)
+        if self.paused:
+            self.channel.pause()
+        self.first_audio_at = time.time()
+
+        starved_since = None
+        while not self.stopped:
+            if self.paused:
+                time.sleep(self.chunk_ms / 4000)
+                continue
+
+            if self.channel.get_queue() is None:
+                self._queued_chunk_started()
+                if self.buffer.available() >= self.chunk_bytes or self.buffer.eof:
+                    sound = self._next_sound()
+                    if sound is not None:
+                        if self.channel.get_busy():
+                            self._queue_chunk(sound)
+                        else:
+                            self._play_chunk(sound)
+                        continue
+                    if not self.channel.get_busy():
+                        # Decoder finished and everything has been played
+                        break
+
+                # The channel ran dry while the decoder is still behind
+                if not self.channel.get_busy() and not self.buffer.eof:
+                    if starved_since is None:
+                        starved_since = time.time()
+                        self.underruns += 1
+                    self.buffer.wait_for(self.chunk_bytes, timeout=self.chunk_ms / 1000)
+                    continue
+
+            if starved_since is not None:
+                self.underrun_ms += int((time.time() - starved_since) * 1000)
+                starved_since = None
+            time.sleep(self.chunk_ms / 4000)
+
+        self._finish()
+
+    def _finish(self):
+        """Signal the end of the stream unless it was stopped on purpose"""
+        if self.stopped:
+            return
+        self.finished = True
+        if self.on_finish:
+            self.on_finish()
+
+    def pause(self):
+        """Pause the mixer channel"""
+        with self.clock_lock:
+            if not self.paused:
+                self.paused_at = time.perf_counter()
+        self.paused = True
+        if self.channel:
+            self.channel.pause()
+
+    def resume(self):
+        """Resume the mixer channel"""
+        with self.clock_lock:
+            # The chunk playing when paused resumes where it stopped
+            if self.paused_at is not None and self.current_since is not None:
+                self.current_since += time.perf_counter() - self.paused_at
+            self.paused_at = None
+        self.paused = False
+        if self.channel:
+            self.channel.unpause()
+
+    def set_volume(self, volume):
+        """Set channel volume (0.0 to 1.0)"""
+        self.volume = volume
+        if self.channel:
+            self.channel.set_volume(volume * self.gain)
+
+    def fade(self, gain, ms, stop_after=False):
+        """Ramp the gain to a target over ms milliseconds in the background"""
+        def ramp():
+            start_gain = self.gain
+            steps = max(1, ms // 20)
+            for step in range(1, steps + 1):
+                if self.stopped:
+                    return
+                self.gain = start_gain + (gain - start_gain) * step / steps
+                if self.channel:
+                    self.channel.set_volume(self.volume * self.gain)
+                time.sleep(ms / steps / 1000)
+            if stop_after:
+                self.stop()
+
+        # A stream that is fading out must not report a natural end
+        if stop_after:
+            self.on_finish = None
+        threading.Thread(target=ramp, daemon=True).start()
+
+    def stop(self):
+        """Stop playback and kill the decoder"""
+        self.stopped = True
+        self.buffer.close()
+        if self.channel:
+            self.channel.stop()
+        if self.process and self.process.poll() is None:
+            self.process.kill()
+
+    def is_active(self):
+        """Check if the stream is still buffering or playing"""
+        return not self.stopped and not self.finished
+
+    def get_time(self):
+        """Position in the source: finished chunks plus the part of the current one already heard"""
+        with self.clock_lock:
+            played = self.played_ms
+            if self.current_since is not None:
+                now = self.paused_at or time.perf_counter()
+                # Past the end of the current chunk the queued one is playing, even if
+                # the feed loop hasn't noticed yet
+                played += max(0.0, min(self.current_ms + self.queued_ms, (now - self.current_since) * 1000))
+        return self.start_ms + int(played)
+
+    def stats(self):
+        """Buffer health counters for tuning buffer sizes"""
+        return {
+            'buffered_ms': int(self.buffer.available() / self.frame_bytes / self.frequency * 1000),
+            'buffer_capacity_ms': int(self.buffer.capacity / self.frame_bytes / self.frequency * 1000),
+            'underruns': self.underruns,
+            'underrun_ms': self.underrun_ms,
+            'decoded_kb': self.bytes_decoded // 1024,
+            'time_to_first_audio_ms': int((self.first_audio_at - self.started_at) * 1000) if self.first_audio_at else None,
+        }
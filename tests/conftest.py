@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# config.py resolves its directories from HOME at import time; keep tests out of the real one
+os.environ['HOME'] = tempfile.mkdtemp(prefix="music-player-tests-")
+# Player tests run pygame's event queue headless; the mixer is the benchmarks' null sink
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+sys.path[:0] = [str(ROOT), str(ROOT / "benchmarks")]
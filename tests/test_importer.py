@@ -0,0 +1,35 @@
+import stubs
+from importer import PlaylistImporter
+from music_sources import SpotifySource
+from store import PlaylistStore
+from test_music_sources import GappySpotify
+
+
+class UnmatchedResolver:
+    """A resolver that finds nothing, leaving every track to be matched at play time"""
+
+    class index:
+        get = staticmethod(lambda track: None)
+        save = staticmethod(lambda: None)
+
+    def is_resolved(self, track):
+        return False
+
+    def resolve(self, track, save=True):
+        return None
+
+
+def test_dropped_items_do_not_leave_the_import_unfinished(tmp_path):
+    stubs.FakeSpotify.latency = stubs.Latency(ms=0)
+    spotify = SpotifySource()
+    spotify._sp = GappySpotify()
+    store = PlaylistStore(tmp_path / "playlists.db", tmp_path / "playlists.json")
+    importer = PlaylistImporter(store, UnmatchedResolver(), rate=0)
+
+    progress = importer.run('gappy', 'Gappy', spotify.iter_playlist_tracks('gappy'), GappySpotify.playlist_size)
+    assert progress.imported == 198 and progress.dropped == 7
+    assert len(store.tracks('Gappy')) == 198
+    # Nothing is left to resume, so a rerun isn't needed
+    assert store.import_target('gappy') is None
+    spotify.executor.shutdown()
+    store.close()
@@ -0,0 +1,72 @@
+import pytest
+import stubs
+import music_sources
+from music_sources import SpotifySource, PageFetchError, PLAYLIST_PAGE_SIZE
+
+
+class FlakySpotify(stubs.FakeSpotify):
+    """A Spotify whose playlist page at fail_offset errors fail_times times"""
+
+    playlist_size = 250
+
+    def __init__(self, fail_offset, fail_times):
+        super().__init__()
+        self.fail_offset = fail_offset
+        self.fail_times = fail_times
+        self.calls = []
+
+    def playlist_items(self, playlist_id, fields=None, limit=100, offset=0, additional_types=None):
+        self.calls.append(offset)
+        if offset == self.fail_offset and self.fail_times:
+            self.fail_times -= 1
+            raise ConnectionError("connection reset")
+        return super().playlist_items(playlist_id, fields, limit, offset, additional_types)
+
+
+class GappySpotify(stubs.FakeSpotify):
+    """A Spotify playlist with a removed track, a local file, and a last page of nothing but removed tracks"""
+
+    playlist_size = 205
+
+    def playlist_items(self, playlist_id, fields=None, limit=100, offset=0, additional_types=None):
+        page = super().playlist_items(playlist_id, fields, limit, offset, additional_types)
+        for n, item in enumerate(page['items'], offset):
+            if n == 3 or n >= 200:
+                item['track'] = None
+            elif n == 150:
+                item.update(is_local=True, track=dict(item['track'], id=None))
+        return page
+
+
+@pytest.fixture
+def spotify(monkeypatch):
+    monkeypatch.setattr(music_sources, 'PAGE_RETRY_DELAY', 0)
+    stubs.FakeSpotify.latency = stubs.Latency(ms=0)
+    source = SpotifySource()
+    yield source
+    source.executor.shutdown()
+
+
+def test_failed_page_is_retried(spotify):
+    spotify._sp = FlakySpotify(fail_offset=PLAYLIST_PAGE_SIZE, fail_times=2)
+    tracks = spotify.get_playlist_tracks('flaky')
+    assert [track.id for track in tracks] == [f"sp{n:08d}" for n in range(250)]
+    assert spotify._sp.calls.count(PLAYLIST_PAGE_SIZE) == 3
+
+
+def test_page_that_keeps_failing_reaches_the_caller(spotify):
+    spotify._sp = FlakySpotify(fail_offset=PLAYLIST_PAGE_SIZE, fail_times=float("inf"))
+    pages = spotify.iter_playlist_tracks('flaky')
+    # Pages before the failure still arrive, then the playlist is reported incomplete
+    assert len(next(pages)) == PLAYLIST_PAGE_SIZE
+    with pytest.raises(PageFetchError):
+        next(pages)
+    with pytest.raises(PageFetchError):
+        spotify.get_playlist_tracks('flaky')
+
+
+def test_pages_count_the_items_they_drop(spotify):
+    spotify._sp = GappySpotify()
+    pages = list(spotify.iter_playlist_tracks('gappy'))
+    assert [len(page) for page in pages] == [99, 99, 0]
+    assert [page.dropped for page in pages] == [1, 1, 5]
@@ -0,0 +1,210 @@
+import time
+import threading
+import pygame
+import pytest
+import stubs
+from jobs import JobCancelled
+from cache import AudioCache
+from player import MusicPlayer, AUDIO_FORMAT
+from track import Track
+
+TRACK_MS = 2000
+
+
+def wait_until(condition, timeout=5):
+    """Poll until condition() holds; False on timeout"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+class Caller(threading.Thread):
+    """A fetch() on its own thread that can be cancelled like a job"""
+
+    def __init__(self, player, video_id):
+        super().__init__(daemon=True)
+        self.player = player
+        self.video_id = video_id
+        self.cancel = threading.Event()
+        self.result = None
+        self.error = None
+        self.start()
+
+    def run(self):
+        try:
+            self.result = self.player.fetch(self.video_id, cancelled=self.cancel.is_set)
+        except Exception as e:
+            self.error = e
+
+
+def settle():
+    """Give end events posted so far time to reach the player thread"""
+    time.sleep(0.2)
+
+
+@pytest.fixture
+def latency():
+    latency = stubs.Latency(ms=20, payload_kb=64, track_ms=TRACK_MS)
+    stubs.install(latency)
+    return latency
+
+
+@pytest.fixture
+def player(tmp_path, latency):
+    player = MusicPlayer(cache=AudioCache(root=tmp_path / "audio"))
+    yield player
+    player.close()
+    # Its event thread must not take the next test's end events
+    player._event_thread.join(timeout=5)
+
+
+@pytest.fixture
+def cached_tracks(player, tmp_path):
+    """Put files for the given ids in the audio cache and return their tracks"""
+    def cached_tracks(*ids):
+        tracks = []
+        for video_id in ids:
+            path = tmp_path / f"{video_id}.opus"
+            path.write_bytes(b'\0' * 1024)
+            player.cache.put(video_id, AUDIO_FORMAT, path)
+            tracks.append(Track(video_id, video_id.upper(), duration_ms=TRACK_MS))
+        return tracks
+    return cached_tracks
+
+
+def test_switching_tracks_keeps_the_new_one_playing(player, cached_tracks):
+    a, b = cached_tracks('a', 'b')
+    assert player.play(a.id, a)
+    assert wait_until(lambda: player.state.playing)
+
+    # Stopping A posts an end event that is handled after B has started
+    assert player.play(b.id, b)
+    settle()
+    state = player.state
+    assert state.track == b
+    assert state.playing
+    assert player.wait_for_track_end(timeout=0) is None
+
+
+def test_natural_end_is_reported_once(player, cached_tracks, latency):
+    latency.track_ms = 100
+    a, = cached_tracks('a')
+    player.load_playlist([a])
+    player.set_index(0)
+    assert player.play(a.id, a)
+
+    finished = player.wait_for_track_end(timeout=5)
+    assert finished is not None and finished.track == a
+    assert not player.state.playing
+    assert player.wait_for_track_end(timeout=0.3) is None
+
+
+def test_stop_while_paused_is_not_a_track_end(player, cached_tracks):
+    a, b = cached_tracks('a', 'b')
+    player.play(a.id, a)
+    player.pause()
+    # A paused stream still posts an end event when it is stopped
+    assert player.play(b.id, b)
+    settle()
+    assert player.state.track == b and player.state.playing
+    assert player.wait_for_track_end(timeout=0) is None
+
+
+def test_gapless_handoff_to_the_queued_track(player, cached_tracks, latency):
+    latency.track_ms = 150
+    a, b = cached_tracks('a', 'b')
+    changes = []
+    player.on_track_change = changes.append
+    player.load_playlist([a, b])
+    player.set_index(0)
+    assert player.play(a.id, a)
+    assert player.queue_next(b, 1)
+
+    # The mixer starts B by itself the moment A ends; the player follows it
+    assert wait_until(lambda: player.state.track == b)
+    state = player.state
+    assert state.index == 1 and state.playing
+    assert changes == [b]
+    a_path, b_path = (player.cache.get(track.id, AUDIO_FORMAT) for track in (a, b))
+    assert [(kind, path) for kind, path, _ in pygame.mixer.music.timeline[:3]] == [
+        ('start', a_path), ('end', a_path), ('start', b_path)]
+
+    # Only B's own end is a finished track
+    finished = player.wait_for_track_end(timeout=5)
+    assert finished.track == b and finished.index == 1
+
+
+def test_stale_queued_file_is_not_promoted(player, cached_tracks, latency):
+    latency.track_ms = 300
+    a, b, c, d = cached_tracks('a', 'b', 'c', 'd')
+    player.load_playlist([a, b])
+    player.set_index(0)
+    assert player.play(a.id, a)
+    assert player.queue_next(b, 1)
+
+    # A new playlist arrives while A plays, but the mixer still has B lined up
+    player.load_playlist([c, d])
+    finished = player.wait_for_track_end(timeout=5)
+    settle()
+    state = player.state
+    assert state.track == a and not state.playing
+    assert not pygame.mixer.music.get_busy()
+    # Auto-play starts the new playlist from its first track
+    assert finished.playlist == (c, d) and finished.index == -1
+
+
+def test_later_pages_extend_only_their_own_playlist(player, cached_tracks):
+    a, b, c, d = cached_tracks('a', 'b', 'c', 'd')
+    load = player.load_playlist([a])
+    before = player.state
+    assert player.extend_playlist(load, [b])
+    assert player.playlist == (a, b)
+    # Snapshots already published keep the playlist they were taken with
+    assert before.playlist == (a,)
+
+    # Pages of a replaced playlist are refused
+    player.load_playlist([c])
+    assert not player.extend_playlist(load, [d])
+    assert player.playlist == (c,)
+
+
+def test_shared_download_survives_one_caller_cancelling(player, latency):
+    latency.ms = 200
+    latency.payload_kb = 1024
+    first, second = Caller(player, 'x'), Caller(player, 'x')
+    time.sleep(0.1)
+    first.cancel.set()
+    first.join(5)
+    second.join(5)
+
+    assert isinstance(first.error, JobCancelled)
+    assert second.error is None and second.result
+    assert player.cache.contains('x', AUDIO_FORMAT)
+    assert latency.downloads == 1
+
+
+def test_shared_download_aborts_once_every_caller_cancels(player, latency):
+    latency.ms = 200
+    latency.payload_kb = 1024
+    callers = [Caller(player, 'x'), Caller(player, 'x')]
+    time.sleep(0.1)
+    for caller in callers:
+        caller.cancel.set()
+    for caller in callers:
+        caller.join(5)
+        assert isinstance(caller.error, JobCancelled)
+
+    # The download stops at its next progress hook and cleans up after itself
+    assert wait_until(lambda: not player._flights)
+    assert latency.downloads == 0
+    assert not player.cache.contains('x', AUDIO_FORMAT)
+    assert not list(player.cache.tmp_dir.glob('x.*'))
+
+    # A later request starts a fresh download
+    again = Caller(player, 'x')
+    again.join(5)
+    assert again.error is None and again.result
+    assert latency.downloads == 1
@@ -0,0 +1,74 @@
+import json
+from store import PlaylistStore
+from track import Track
+
+# Track dicts as the JSON playlist file stored them, before duration_ms existed
+LEGACY_TRACKS = [
+    {'id': 'a1', 'title': 'First', 'artist': 'Artist', 'album': 'Album', 'duration': '3:45',
+     'thumbnail': 'https://img/a1.jpg', 'source': 'youtube'},
+    {'id': 'a2', 'title': 'Second', 'artist': 'Artist', 'album': 'Album', 'duration': '1:02:03',
+     'thumbnail': '', 'source': 'youtube'},
+    {'id': 'a3', 'title': 'Third', 'artist': 'Artist', 'album': '', 'duration': 'Unknown',
+     'thumbnail': '', 'source': 'spotify'},
+]
+
+
+def write_legacy(path, text):
+    path.write_text(text)
+    return path
+
+
+def test_migrates_legacy_durations(tmp_path):
+    legacy = write_legacy(tmp_path / "playlists.json", json.dumps({'Mix': LEGACY_TRACKS, 'Empty': []}))
+    store = PlaylistStore(tmp_path / "playlists.db", legacy)
+
+    tracks = store.tracks('Mix')
+    assert [track.id for track in tracks] == ['a1', 'a2', 'a3']
+    assert [track.duration_ms for track in tracks] == [225000, 3723000, 0]
+    assert tracks[0] == Track('a1', 'First', 'Artist', 'Album', 225000, 'https://img/a1.jpg', 'youtube')
+    assert tracks[2].source == 'spotify'
+    assert store.counts() == {'Mix': 3, 'Empty': 0}
+    assert not legacy.exists()
+    assert (tmp_path / "playlists.json.migrated").exists()
+    store.close()
+
+
+def test_duplicate_names_keep_one_playlist(tmp_path):
+    # The old file was written by json.dump, so a repeated key is possible only by hand; the last one wins
+    text = '{"Mix": %s, "Mix": %s}' % (json.dumps(LEGACY_TRACKS[:1]), json.dumps(LEGACY_TRACKS[1:]))
+    legacy = write_legacy(tmp_path / "playlists.json", text)
+    store = PlaylistStore(tmp_path / "playlists.db", legacy)
+
+    assert [track.id for track in store.tracks('Mix')] == ['a2', 'a3']
+    assert store.counts() == {'Mix': 2}
+    store.close()
+
+
+def test_existing_playlist_is_not_overwritten(tmp_path):
+    db_path = tmp_path / "playlists.db"
+    store = PlaylistStore(db_path, None)
+    store.create('Mix')
+    store.append('Mix', Track('b1', 'Kept', 'Artist'))
+    store.close()
+
+    legacy = write_legacy(tmp_path / "playlists.json", json.dumps({'Mix': LEGACY_TRACKS, 'Other': LEGACY_TRACKS[:1]}))
+    store = PlaylistStore(db_path, legacy)
+    assert [track.id for track in store.tracks('Mix')] == ['b1']
+    assert [track.id for track in store.tracks('Other')] == ['a1']
+    store.close()
+
+
+def test_second_start_does_not_migrate_again(tmp_path):
+    db_path = tmp_path / "playlists.db"
+    legacy = write_legacy(tmp_path / "playlists.json", json.dumps({'Mix': LEGACY_TRACKS}))
+    PlaylistStore(db_path, legacy).close()
+
+    store = PlaylistStore(db_path, legacy)
+    assert store.counts() == {'Mix': 3}
+    store.append('Mix', Track('a4', 'Fourth', 'Artist', duration_ms=1000))
+    store.close()
+
+    store = PlaylistStore(db_path, legacy)
+    assert [track.id for track in store.tracks('Mix')] == ['a1', 'a2', 'a3', 'a4']
+    assert store.tracks('Mix')[1].duration_ms == 3723000
+    store.close()
@@ -0,0 +1,118 @@
+import json
+import time
+import threading
+from collections import defaultdict, deque
+
+# Durations kept per span for the percentiles shown by `stats`
+MAX_SAMPLES = 1000
+
+
+class _NullSpan:
+    """What span() hands out while tracing is off: entering and leaving it does nothing"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'started')
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracer.record(self.name, (time.perf_counter() - self.started) * 1000, error=exc_type is not None)
+        return False
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Tracer:
+    """Timing spans and hit/miss counters for the playback and search hot paths"""
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.samples = defaultdict(lambda: deque(maxlen=MAX_SAMPLES))
+        self.counters = defaultdict(int)
+        self.export_file = None
+
+    def enable(self, export_path=None):
+        """Start collecting, optionally appending every event to a JSONL file"""
+        with self.lock:
+            if export_path and not self.export_file:
+                self.export_file = open(export_path, 'a', buffering=1)
+            self.enabled = True
+
+    def disable(self):
+        """Stop collecting; what was collected so far is kept"""
+        self.enabled = False
+
+    def span(self, name):
+        """Context manager timing one stage, e.g. `with tracer.span('player.fetch'):`"""
+        return _Span(self, name) if self.enabled else NULL_SPAN
+
+    def record(self, name, ms, error=False):
+        """Add a duration measured elsewhere (e.g. in a yt-dlp hook)"""
+        if not self.enabled:
+            return
+        with self.lock:
+            self.samples[name].append(ms)
+            self._export({'span': name, 'ms': round(ms, 3), 'error': error})
+
+    def count(self, name, n=1):
+        """Bump a counter such as 'audio_cache.hit'"""
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] += n
+            self._export({'counter': name, 'n': n})
+
+    def _export(self, event):
+        if self.export_file:
+            event['ts'] = round(time.time(), 6)
+            event['thread'] = threading.current_thread().name
+            self.export_file.write(json.dumps(event) + '\n')
+
+    def stats(self):
+        """Per-span (name, count, p50, p95, max) rows and a copy of the counters"""
+        with self.lock:
+            rows = []
+            for name, samples in sorted(self.samples.items()):
+                ordered = sorted(samples)
+                rows.append((name, len(ordered), percentile(ordered, 0.5),
+                             percentile(ordered, 0.95), ordered[-1]))
+            return rows, dict(self.counters)
+
+    def reset(self):
+        """Forget all collected spans and counters"""
+        with self.lock:
+            self.samples.clear()
+            self.counters.clear()
+
+    def close(self):
+        """Stop collecting and close the export file"""
+        with self.lock:
+            self.enabled = False
+            if self.export_file:
+                self.export_file.close()
+                self.export_file = None
+
+
+tracer = Tracer()
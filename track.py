@@ -0,0 +1,79 @@
+import sys
+from typing import NamedTuple, Optional
+
+
+def parse_duration(duration):
+    """Parse an 'm:ss' (or 'h:mm:ss') duration string into milliseconds, 0 if unknown"""
+    try:
+        parts = [int(p) for p in str(duration).split(':')]
+    except ValueError:
+        return 0
+    seconds = 0
+    for part in parts:
+        seconds = seconds * 60 + part
+    return seconds * 1000
+
+
+def format_duration(duration_ms):
+    """Format milliseconds as 'm:ss'"""
+    return f"{duration_ms // 60000}:{(duration_ms // 1000) % 60:02d}"
+
+
+class _TrackFields(NamedTuple):
+    id: str
+    title: str
+    artist: str
+    album: str
+    duration_ms: int
+    thumbnail: str
+    source: str
+    isrc: Optional[str]
+
+
+class Track(_TrackFields):
+    """Immutable track metadata; a tuple, so there is no per-track dict"""
+
+    __slots__ = ()
+
+    def __new__(cls, id, title, artist='', album='', duration_ms=0, thumbnail='', source='youtube', isrc=None):
+        # Artists, albums and sources repeat across a queue, so share one copy of each
+        return super().__new__(cls, id, title, sys.intern(artist or ''), sys.intern(album or ''),
+                               int(duration_ms or 0), thumbnail or '', sys.intern(source), isrc)
+
+    @property
+    def duration(self):
+        """Duration formatted for display"""
+        return format_duration(self.duration_ms) if self.duration_ms else 'Unknown'
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a track from its JSON shape (as saved in playlists and caches)"""
+        duration_ms = data.get('duration_ms')
+        if duration_ms is None:
+            duration_ms = parse_duration(data.get('duration'))
+        return cls(
+            id=data.get('id'),
+            title=data.get('title', 'Unknown'),
+            artist=data.get('artist', ''),
+            album=data.get('album', 'Unknown'),
+            duration_ms=duration_ms,
+            thumbnail=data.get('thumbnail', ''),
+            source=data.get('source', 'youtube'),
+            isrc=data.get('isrc'),
+        )
+
+    def to_dict(self):
+        """JSON shape of the track, compatible with older saved playlists"""
+        data = {
+            'id': self.id,
+            'title': self.title,
+            'artist': self.artist,
+            'album': self.album,
+            'duration': self.duration,
+            'duration_ms': self.duration_ms,
+            'thumbnail': self.thumbnail,
+            'source': self.source,
+        }
+        if self.isrc:
+            data['isrc'] = self.isrc
+        return data
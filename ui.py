@@ -1,17 +1,20 @@
-from rich.console import Console
+from rich.console import Console, Group
 from rich.table import Table
 from rich.panel import Panel
 from rich.layout import Layout
 from rich.live import Live
 from rich.text import Text
 from rich.progress import Progress, BarColumn, TextColumn
-import requests
-from PIL import Image
-from io import BytesIO
 import os
+import sys
+import time
+import codecs
 
 console = Console()
 
+# How often the live prompt checks for player changes (it only redraws on a change)
+NOW_PLAYING_FPS = 4
+
 def display_search_results(tracks):
     """Display search results in a table"""
     if not tracks:
@@ -29,40 +32,36 @@ def display_search_results(tracks):
     for idx, track in enumerate(tracks, 1):
         table.add_row(
             str(idx),
-            track['title'][:40],
-            track['artist'][:30],
-            track['album'][:30],
-            track['duration'],
-            track['source']
+            track.title[:40],
+            track.artist[:30],
+            track.album[:30],
+            track.duration,
+            track.source
         )
     
     console.print(table)
 
-def display_now_playing(track, player):
+def display_now_playing(track, player, artwork=None):
     """Display now playing information"""
-    import os
-    
-    # Clear previous display (Windows compatible)
-    if os.name == 'nt':
-        os.system('cls')
-    else:
-        os.system('clear')
-    
     if not track:
         console.print("[dim]No track playing[/dim]")
         return
     
-    title = f"🎵 {track['title']}"
-    artist = f"👤 {track['artist']}"
-    album = f"💿 {track['album']}"
-    source = f"📡 {track['source'].upper()}"
+    console.print(render_now_playing(track, player, artwork))
+
+def render_now_playing(track, player, artwork=None):
+    """Build the now playing panel"""
+    title = f"🎵 {track.title}"
+    artist = f"👤 {track.artist}"
+    album = f"💿 {track.album}"
+    source = f"📡 {track.source.upper()}"
     
     # Progress bar
     length = player.get_length()
-    current = player.get_time()
+    current = min(player.get_time(), length)
     
     if length > 0:
-        progress = current / length
+        progress = player.get_position()
         current_time = f"{current // 60000}:{(current // 1000) % 60:02d}"
         total_time = f"{length // 60000}:{(length // 1000) % 60:02d}"
         bar_width = 40
@@ -73,13 +72,20 @@ def display_now_playing(track, player):
         progress_text = "Loading..."
     
     volume = f"🔊 Volume: {player.get_volume()}%"
+    
+    # Stream buffer health (streaming mode only)
+    stream_info = ""
+    stream_stats = player.stream_stats()
+    if stream_stats:
+        stream_info = (f"\n📶 Buffer: {stream_stats['buffered_ms']}/{stream_stats['buffer_capacity_ms']} ms"
+                       f" | Underruns: {stream_stats['underruns']} ({stream_stats['underrun_ms']} ms)")
     state = "▶️  Playing" if player.is_playing_state() else "⏸️  Paused"
     
     # Next track info
     next_track_info = ""
     if player.playlist and player.current_index < len(player.playlist) - 1:
         next_track = player.playlist[player.current_index + 1]
-        next_track_info = f"\n⏭️  Next: {next_track['title']} - {next_track['artist']}"
+        next_track_info = f"\n⏭️  Next: {next_track.title} - {next_track.artist}"
     
     panel_content = f"""
 {title}
@@ -89,19 +95,131 @@ def display_now_playing(track, player):
 
 {progress_text}
 
-{state} | {volume}{next_track_info}
+{state} | {volume}{stream_info}{next_track_info}
 """
     
-    panel = Panel(
+    # Album art sits to the left once it has been fetched; until then the panel is text only
+    art = artwork.get(track.thumbnail) if artwork else None
+    if art is not None:
+        body = Table.grid(padding=(0, 2))
+        body.add_column(vertical="middle")
+        body.add_column()
+        body.add_row(art, panel_content)
+        panel_content = body
+    
+    return Panel(
         panel_content,
         title="[bold green]♪ Now Playing ♪[/bold green]",
         border_style="green"
     )
+
+def now_playing_state(player, artwork=None):
+    """Everything the now playing panel shows, at the resolution it shows it"""
+    # One consistent snapshot rather than fields read while the player changes
+    snapshot = player.state if player else None
+    if not snapshot or not snapshot.track:
+        return None
+    next_track = None
+    if snapshot.playlist and snapshot.index < len(snapshot.playlist) - 1:
+        next_track = snapshot.playlist[snapshot.index + 1]
+    stats = player.stream_stats()
+    return (
+        snapshot.track,
+        player.is_playing_state(),
+        snapshot.volume,
+        player.get_time() // 1000,
+        player.get_length(),
+        next_track,
+        stats and (stats['buffered_ms'], stats['underruns'], stats['underrun_ms']),
+        # Starts loading the album art, and redraws once it arrives
+        artwork is not None and artwork.get(snapshot.track.thumbnail) is not None,
+    )
+
+class LivePrompt:
+    """Command prompt with a live now playing panel above it"""
+    
+    def __init__(self, get_player, get_artwork=lambda: None, fps=NOW_PLAYING_FPS):
+        self.get_player = get_player
+        self.get_artwork = get_artwork
+        self.fps = fps
+        self.interactive = sys.stdin.isatty() and console.is_terminal
+    
+    def _render(self, prompt, line, state):
+        """The panel (while something is loaded) and the line being typed"""
+        text = Text.assemble((prompt, "bold yellow"), " ", line, (" ", "reverse"))
+        if state is None:
+            return text
+        return Group(render_now_playing(state[0], self.get_player(), self.get_artwork()), text)
     
-    console.print(panel)
+    def _read_keys(self, timeout):
+        """Characters typed within timeout seconds, without waiting for Enter"""
+        if os.name == 'nt':
+            import msvcrt
+            deadline = time.time() + timeout
+            while not msvcrt.kbhit() and time.time() < deadline:
+                time.sleep(0.01)
+            keys = ""
+            while msvcrt.kbhit():
+                keys += msvcrt.getwch()
+            return keys
+        
+        import select
+        ready, _, _ = select.select([sys.stdin], [], [], timeout)
+        if not ready:
+            return ""
+        return self._decoder.decode(os.read(sys.stdin.fileno(), 1024))
+    
+    def input(self, prompt=""):
+        """Read a command line while keeping the panel up to date"""
+        if not self.interactive:
+            return get_input(prompt)
+        
+        restore = None
+        if os.name != 'nt':
+            import termios
+            import tty
+            fd = sys.stdin.fileno()
+            saved = termios.tcgetattr(fd)
+            restore = lambda: termios.tcsetattr(fd, termios.TCSADRAIN, saved)
+            # Keys arrive one at a time, unechoed; Ctrl+C still interrupts
+            tty.setcbreak(fd)
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+        
+        line = ""
+        escape = None
+        shown = None
+        try:
+            with Live(console=console, auto_refresh=False, transient=True) as live:
+                while True:
+                    state = now_playing_state(self.get_player(), self.get_artwork())
+                    if (state, line) != shown:
+                        live.update(self._render(prompt, line, state), refresh=True)
+                        shown = (state, line)
+                    
+                    for key in self._read_keys(1 / self.fps):
+                        # Drop escape sequences (arrow keys etc.), which may arrive split up
+                        if escape is not None:
+                            escape += key
+                            if escape[0] not in "[O" or len(escape) > 1 and "@" <= key <= "~":
+                                escape = None
+                            continue
+                        if key == "\x1b":
+                            escape = ""
+                        elif key in "\r\n":
+                            console.print(Text.assemble((prompt, "bold yellow"), " ", line))
+                            return line
+                        elif key in "\x7f\b":
+                            line = line[:-1]
+                        elif key == "\x15":  # Ctrl+U
+                            line = ""
+                        elif key.isprintable():
+                            line += key
+        finally:
+            if restore:
+                restore()
 
 def display_playlists(playlists):
-    """Display playlists"""
+    """Display playlists (a dict of playlist name to track count)"""
     if not playlists:
         console.print("[yellow]No playlists found[/yellow]")
         return
@@ -111,8 +229,51 @@ def display_playlists(playlists):
     table.add_column("Name", style="cyan")
     table.add_column("Tracks", justify="right")
     
-    for idx, (name, tracks) in enumerate(playlists.items(), 1):
-        table.add_row(str(idx), name, str(len(tracks)))
+    for idx, (name, count) in enumerate(playlists.items(), 1):
+        table.add_row(str(idx), name, str(count))
+    
+    console.print(table)
+
+def display_stats(rows, counters):
+    """Display per-stage timings (name, count, p50, p95, max in ms) and hit/miss counters"""
+    if not rows and not counters:
+        console.print("[yellow]No timings recorded yet[/yellow]")
+        return
+    
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("Stage", style="cyan")
+    table.add_column("Count", justify="right")
+    table.add_column("p50 ms", justify="right")
+    table.add_column("p95 ms", justify="right")
+    table.add_column("Max ms", justify="right")
+    
+    for name, count, p50, p95, worst in rows:
+        table.add_row(name, str(count), f"{p50:.1f}", f"{p95:.1f}", f"{worst:.1f}")
+    
+    console.print(table)
+    
+    # Show counters as hit rates when they come in hit/miss pairs
+    for prefix in sorted({name.rsplit('.', 1)[0] for name in counters}):
+        hits = counters.get(f"{prefix}.hit", 0)
+        misses = counters.get(f"{prefix}.miss", 0)
+        if hits + misses:
+            console.print(f"[green]{prefix}[/green]: {hits} hits, {misses} misses "
+                          f"({hits / (hits + misses):.0%} hit rate)")
+
+def display_jobs(jobs):
+    """Display commands still running in the background"""
+    if not jobs:
+        console.print("[dim]Nothing running[/dim]")
+        return
+    
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("#", style="dim", width=4)
+    table.add_column("Command", style="cyan")
+    table.add_column("State")
+    table.add_column("Time", justify="right")
+    
+    for job in jobs:
+        table.add_row(str(job.id), job.description, job.state, f"{job.elapsed:.1f}s")
     
     console.print(table)
 
@@ -123,10 +284,13 @@ def display_menu():
 
 [bold]Commands:[/bold]
   [green]search <query>[/green]          - Search for music
+  [green]search --fresh <query>[/green]  - Search, bypassing cached results
+  [green]search --local <query>[/green]  - Search only tracks you've saved, played or found before
   [green]play <number>[/green]           - Play track from search results
   [green]pause[/green]                   - Pause playback
   [green]resume[/green]                  - Resume playback
   [green]stop[/green]                    - Stop playback
+  [green]seek <m:ss|+s|-s>[/green]       - Jump to a time (or forward/back)
   [green]next[/green]                    - Next track
   [green]prev[/green]                    - Previous track
   [green]vol <0-100>[/green]             - Set volume
@@ -135,15 +299,21 @@ def display_menu():
   [green]playlist add <name>[/green]     - Add current track to playlist
   [green]playlist show[/green]           - Show all playlists
   [green]playlist load <name>[/green]    - Load and play playlist
+  [green]playlist cache <name>[/green]   - Download playlist for offline play
   [green]spotify playlists[/green]       - Show Spotify playlists
   [green]spotify show <number>[/green]   - Show tracks in Spotify playlist
   [green]spotify load <number>[/green]   - Load and play Spotify playlist
+  [green]spotify import <number> \\[name][/green] - Copy Spotify playlist into a local one
+  [green]spotify cache <number>[/green]  - Download Spotify playlist for offline play
   [green]shuffle[/green]                 - Shuffle current playlist and play
   [green]page <number>[/green]           - Navigate to page number
   [green]settings[/green]                - Show current settings
   [green]set <setting> <value>[/green]   - Update a setting
   [green]config[/green]                  - Configure API keys
-  [green]now[/green]                     - Show now playing (auto-refreshes)
+  [green]now[/green]                     - Show now playing
+  [green]stats[/green]                   - Show timing per playback/search stage ('stats reset' clears)
+  [green]jobs[/green]                    - Show searches/loads in progress
+  [green]jobs cancel <id|all>[/green]    - Cancel work in progress
   [green]help[/green]                    - Show this menu
   [green]quit[/green]                    - Exit player
 
@@ -153,7 +323,7 @@ def display_menu():
 
 def clear_screen():
     """Clear the console screen"""
-    os.system('cls' if os.name == 'nt' else 'clear')
+    console.clear()
 
 def get_input(prompt=""):
     """Get user input with prompt"""